@@ -0,0 +1,264 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmark.synthetic import SyntheticWorkspace
+
+# Local stand-in for Asana API serving a SyntheticWorkspace through the endpoints used by the exporter
+# (including batch API, events and attachment downloads), with configurable latency and rate limiting.
+
+API_PREFIX = "/api/1.0"
+
+class FakeAsanaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, workspace: SyntheticWorkspace, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, rate_limit: float = None, retry_after: int = 1):
+        """
+        latency - seconds added to every response
+        rate_limit - allowed requests per second, requests above the limit get 429 with Retry-After
+        failures can be injected with `fail`
+        """
+        super().__init__((host, port), FakeAsanaHandler)
+        self.workspace = workspace
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._tokens = rate_limit if rate_limit else 0
+        self._refilled_at = time.monotonic()
+        self.stats = {"requests": 0, "rate_limited": 0, "bytes": 0}
+        self.endpoint_counts = {}
+        # sync tokens issued before the current epoch are expired
+        self.sync_epoch = 0
+        # endpoint -> number of its next requests answered with 500
+        self.failures = {}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    @property
+    def api_url(self) -> str:
+        return self.base_url + API_PREFIX
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-asana", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def record(self, endpoint: str, sent_bytes: int, rate_limited: bool = False):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += sent_bytes
+            if rate_limited:
+                self.stats["rate_limited"] += 1
+            self.endpoint_counts[endpoint] = self.endpoint_counts.get(endpoint, 0) + 1
+
+    def take_token(self) -> bool:
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def fail(self, endpoint: str, count: int = 1):
+        """Next `count` requests of `endpoint` (e.g. "get_stories_for_task") fail with 500"""
+        with self._lock:
+            self.failures[endpoint] = self.failures.get(endpoint, 0) + count
+
+    def take_failure(self, endpoint: str) -> bool:
+        with self._lock:
+            if not self.failures.get(endpoint):
+                return False
+            self.failures[endpoint] -= 1
+            return True
+
+    def expire_sync_tokens(self):
+        with self._lock:
+            self.sync_epoch += 1
+
+    def events(self, query: dict) -> tuple[int, dict]:
+        """Events API - returns status and body, sync token is <epoch>:<number of seen events>"""
+        resource = query.get("resource", [None])[0]
+        events = self.workspace.events.get(resource, [])
+        current = f"{self.sync_epoch}:{len(events)}"
+        token = query.get("sync", [None])[0]
+        epoch, _, seen = (token or "").partition(":")
+        if token is None or epoch != str(self.sync_epoch) or not seen.isdigit():
+            return 412, {"errors": [{"message": "Sync token invalid or too old."}], "sync": current}
+        seen = int(seen)
+        data = events[seen:seen + 100]
+        return 200, {"data": data, "sync": f"{self.sync_epoch}:{seen + len(data)}", "has_more": seen + len(data) < len(events)}
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def route(self, path: str, query: dict) -> tuple[str, dict | None]:
+        """Returns name of endpoint and paginated response (or None if not found)"""
+        ws = self.workspace
+        if path == "/workspaces":
+            return "get_workspaces", self.page(ws.workspaces, query, path)
+        if path == "/attachments":
+            parent = query.get("parent", [None])[0]
+            items = [dict(atch, download_url=f"{self.base_url}/downloads/{atch['gid']}") for atch in ws.attachments.get(parent, [])]
+            return "get_attachments_for_object", self.page(items, query, path)
+        match = re.fullmatch(r"/tasks/(\d+)", path)
+        if match is not None:
+            task = ws.task_index.get(match.group(1))
+            return "get_task", {"data": self.select_fields(task, query)} if task is not None else None
+        match = re.fullmatch(r"/(workspaces|projects|tasks)/(\d+)/(projects|tasks|subtasks|stories)", path)
+        if match is None:
+            return "unknown", None
+        collections = {
+            ("workspaces", "projects"): ("get_projects_for_workspace", ws.projects),
+            ("projects", "tasks"): ("get_tasks_for_project", ws.tasks),
+            ("tasks", "subtasks"): ("get_subtasks_for_task", ws.subtasks),
+            ("tasks", "stories"): ("get_stories_for_task", ws.stories),
+        }
+        endpoint, collection = collections.get((match.group(1), match.group(3)), ("unknown", None))
+        if collection is None or match.group(2) not in collection:
+            return endpoint, None
+        items = collection[match.group(2)]
+        if "archived" in query:
+            archived = query["archived"][0].lower() == "true"
+            items = [item for item in items if item.get("archived") == archived]
+        if "completed_since" in query:
+            since = query["completed_since"][0]
+            items = [item for item in items if not item.get("completed") or (since != "now" and item.get("completed_at", "") >= since)]
+        return endpoint, self.page(items, query, path)
+
+    @staticmethod
+    def select_fields(item: dict, query: dict) -> dict:
+        """Returns only gid, resource_type and (top level) fields requested by opt_fields"""
+        if "opt_fields" not in query:
+            return item
+        fields = {field.split(".")[0] for field in query["opt_fields"][0].split(",")} | {"gid", "resource_type"}
+        return {key: value for key, value in item.items() if key in fields}
+
+    @classmethod
+    def page(cls, items: list, query: dict, path: str) -> dict:
+        limit = int(query.get("limit", ["50"])[0])
+        offset = int(query.get("offset", ["0"])[0])
+        next_page = None
+        if offset + limit < len(items):
+            next_page = {"offset": str(offset + limit), "path": f"{path}?limit={limit}&offset={offset + limit}", "uri": None}
+        return {"data": [cls.select_fields(item, query) for item in items[offset:offset + limit]], "next_page": next_page}
+
+
+class FakeAsanaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeAsanaServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, endpoint: str, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.record(endpoint, len(data), rate_limited=status == 429)
+
+    def before_request(self, endpoint: str) -> bool:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.take_token():
+            self.send_json(endpoint, 429, {"errors": [{"message": "You have made too many requests recently."}]},
+                           {"Retry-After": str(self.server.retry_after)})
+            return False
+        if self.server.take_failure(endpoint):
+            self.send_json(endpoint, 500, {"errors": [{"message": "Server Error"}]})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith("/downloads/"):
+            return self.download(url.path.rsplit("/", 1)[-1])
+        if url.path.removeprefix(API_PREFIX) == "/events":
+            if not self.before_request("get_events"):
+                return
+            return self.send_json("get_events", *self.server.events(query))
+        endpoint, body = self.server.route(url.path.removeprefix(API_PREFIX), query)
+        if not self.before_request(endpoint):
+            return
+        if body is None:
+            return self.send_json(endpoint, 404, {"errors": [{"message": "Not found"}]})
+        self.send_json(endpoint, 200, body)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.removeprefix(API_PREFIX) != "/batch":
+            return self.send_json("unknown", 404, {"errors": [{"message": "Not found"}]})
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if not self.before_request("create_batch_request"):
+            return
+        results = []
+        for action in request["data"]["actions"]:
+            action_url = urlparse(action["relative_path"])
+            query = parse_qs(action_url.query)
+            options = action.get("options", {})
+            for key in ("limit", "offset"):
+                if key in options:
+                    query[key] = [str(options[key])]
+            for key, value in (action.get("data") or {}).items():
+                query[key] = [value]
+            _, body = self.server.route(action_url.path, query)
+            if body is None:
+                results.append({"status_code": 404, "headers": {}, "body": {"errors": [{"message": "Not found"}]}})
+            else:
+                results.append({"status_code": 200, "headers": {}, "body": body})
+        self.send_json("create_batch_request", 200, {"data": results})
+
+    def download(self, gid: str):
+        size = self.server.workspace.attachment_sizes.get(gid)
+        if size is None:
+            return self.send_json("download", 404, {"errors": [{"message": "Not found"}]})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        start = 0
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match is not None:
+            start = int(match.group(1))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size - start))
+        self.end_headers()
+        # content depends only on position, so resumed downloads continue with the same bytes
+        pattern = gid.encode("ascii") + b"\n"
+        block = pattern * (65536 // len(pattern) + 2)
+        position = start
+        while position < size:
+            offset = position % len(pattern)
+            data = block[offset:offset + min(65536, size - position)]
+            self.wfile.write(data)
+            position += len(data)
+        self.server.record("download", size - start)
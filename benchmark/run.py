@@ -0,0 +1,184 @@
+"""Offline benchmark of the exporter against a local fake Asana server
+
+Run from the repository root, e.g.:
+    python -m benchmark.run --projects 10 --tasks 200 --latency 0.02 --rate-limit 150
+
+Every phase (crawl, load_from_raw, exportAll) runs in its own process, so the reported
+peak RSS belongs to that phase only. With --streaming the phases fetch (or load) and render
+one project at a time, with --trace-memory the peak of memory allocated by Python is measured
+by tracemalloc as well - e.g. compare runs with different --projects to check that the peak
+of a streaming export is given by the largest project:
+    python -m benchmark.run --projects 4 --streaming --trace-memory --no-search-index
+    python -m benchmark.run --projects 16 --streaming --trace-memory --no-search-index
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import exporter
+from benchmark.fake_server import FakeAsanaServer
+from benchmark.synthetic import SyntheticWorkspace
+
+parser = argparse.ArgumentParser(
+            prog="Asana exporter benchmark",
+            description="Measures crawl, load and render performance on a synthetic workspace served by a local fake Asana API",
+            )
+parser.add_argument("--projects", type=int, default=5, help="default=5")
+parser.add_argument("--tasks", type=int, default=100, help="tasks per project, default=100")
+parser.add_argument("--subtasks", type=int, default=2, help="subtasks per task, default=2")
+parser.add_argument("--depth", type=int, default=1, help="depth of subtask tree, default=1")
+parser.add_argument("--stories", type=int, default=5, help="stories per task, default=5")
+parser.add_argument("--attachments", type=int, default=1, help="attachments per task, default=1")
+parser.add_argument("--attachment-size", type=int, default=100_000, help="bytes, default=100000")
+parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response, default=0")
+parser.add_argument("--rate-limit", type=float, default=None, help="allowed requests per second, default=unlimited")
+parser.add_argument("-j", "--jobs", type=int, default=8, help="default=8")
+parser.add_argument("--download-jobs", type=int, default=4, help="default=4")
+parser.add_argument("-b", "--batch-requests", action='store_true')
+parser.add_argument("--render-processes", type=int, default=1, help="default=1")
+parser.add_argument("-o", "--output-dir", default="bench_out/", help="default=./bench_out/")
+parser.add_argument("--report", help="write results as JSON to this file")
+parser.add_argument("--streaming", action='store_true', help="fetch, load and render one project at a time")
+parser.add_argument("--trace-memory", action='store_true', help="measure peak memory allocated by Python with tracemalloc (slower)")
+parser.add_argument("--no-search-index", action='store_true', help="do not build the search index (it holds all tasks)")
+
+def peak_rss() -> int:
+    """Peak resident set size of current process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def create_config(args, output_dir: Path, api_client=None) -> exporter.ExportConfig:
+    return exporter.ExportConfig(
+        api_client=api_client,
+        output_dir=output_dir,
+        html_templates=exporter.create_templates(),
+        network=exporter.NetworkOptions(
+            concurrency=args.jobs,
+            download_concurrency=args.download_jobs,
+            batch_requests=args.batch_requests,
+        ),
+        output=exporter.OutputOptions(
+            download_attachments=api_client is not None and args.attachments > 0,
+            render_processes=args.render_processes,
+            search_index=not args.no_search_index,
+        ),
+    )
+
+def crawl(args, output_dir: Path) -> float:
+    cfg = create_config(args, output_dir, exporter.create_api_client(args.jobs))
+    start = time.perf_counter()
+    exporter.AsanaExporter(cfg).getAll()
+    cfg.shutdown()
+    return time.perf_counter() - start
+
+def load_from_raw(args, output_dir: Path) -> float:
+    cfg = create_config(args, output_dir)
+    start = time.perf_counter()
+    exporter.AsanaExporter(cfg).load_from_raw()
+    return time.perf_counter() - start
+
+def export_all(args, output_dir: Path) -> float:
+    cfg = create_config(args, output_dir)
+    asana_exporter = exporter.AsanaExporter(cfg)
+    asana_exporter.load_from_raw()
+    start = time.perf_counter()
+    asana_exporter.exportAll()
+    return time.perf_counter() - start
+
+def stream(args, output_dir: Path) -> float:
+    cfg = create_config(args, output_dir, exporter.create_api_client(args.jobs))
+    start = time.perf_counter()
+    exporter.AsanaExporter(cfg).streamAll()
+    cfg.shutdown()
+    return time.perf_counter() - start
+
+def stream_local(args, output_dir: Path) -> float:
+    cfg = create_config(args, output_dir)
+    start = time.perf_counter()
+    exporter.AsanaExporter(cfg).streamAll(load_local=True)
+    return time.perf_counter() - start
+
+PHASES = {
+    "getAll": crawl,
+    "load_from_raw": load_from_raw,
+    "exportAll": export_all,
+}
+
+STREAMING_PHASES = {
+    "streamAll": stream,
+    "streamAll_local": stream_local,
+}
+
+def _run_in_child(conn, phase: str, args, output_dir: Path):
+    if args.trace_memory:
+        tracemalloc.start()
+    seconds = (STREAMING_PHASES if args.streaming else PHASES)[phase](args, output_dir)
+    result = {"seconds": seconds, "peak_rss": peak_rss()}
+    if args.trace_memory:
+        result["peak_traced"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    conn.send(result)
+    conn.close()
+
+def run_phase(phase: str, args, output_dir: Path, server: FakeAsanaServer, task_count: int) -> dict:
+    ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = ctx.Pipe()
+    before = server.snapshot_stats()
+    process = ctx.Process(target=_run_in_child, args=(child_conn, phase, args, output_dir))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    after = server.snapshot_stats()
+    requests = after["requests"] - before["requests"]
+    seconds = result["seconds"]
+    return {
+        "phase": phase,
+        "seconds": round(seconds, 3),
+        "tasks_per_sec": round(task_count / seconds, 1) if seconds > 0 else None,
+        "requests": requests,
+        "requests_per_sec": round(requests / seconds, 1) if seconds > 0 else None,
+        "rate_limited": after["rate_limited"] - before["rate_limited"],
+        "bytes": after["bytes"] - before["bytes"],
+        "peak_rss_mb": round(result["peak_rss"] / 2**20, 1),
+        "peak_traced_mb": round(result["peak_traced"] / 2**20, 1) if "peak_traced" in result else None,
+    }
+
+def main(args):
+    logging.basicConfig(level=logging.WARNING)
+    output_dir = Path(args.output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+
+    workspace = SyntheticWorkspace(
+        projects=args.projects, tasks=args.tasks, subtasks=args.subtasks, depth=args.depth,
+        stories=args.stories, attachments=args.attachments, attachment_size=args.attachment_size,
+    )
+    server = FakeAsanaServer(workspace, latency=args.latency, rate_limit=args.rate_limit).start()
+    os.environ["ASANA_HOST"] = server.api_url
+    os.environ["ASANA_TOKEN"] = "benchmark"
+    print(f"Synthetic workspace: {args.projects} projects, {workspace.task_count} tasks (including subtasks), served at {server.api_url}")
+
+    results = []
+    try:
+        for phase in (STREAMING_PHASES if args.streaming else PHASES):
+            result = run_phase(phase, args, output_dir, server, workspace.task_count)
+            results.append(result)
+            print(" ".join(f"{key}={value}" for key, value in result.items()))
+    finally:
+        server.stop()
+
+    print(f"Requests per endpoint: {server.endpoint_counts}")
+    if args.report:
+        with open(args.report, mode="w") as f:
+            json.dump({"config": vars(args), "task_count": workspace.task_count, "endpoints": server.endpoint_counts, "phases": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+"""Startup time of offline HTML regeneration (`exporter.py --load-local-responses`)
+
+Run from the repository root, e.g.:
+    python -m benchmark.startup --runs 5
+
+Every measurement runs in a fresh interpreter: import of exporter.py, loading of templates
+without and with the bytecode cache, and the whole regeneration of a small synthetic export.
+It also reports network-only modules imported by the offline run (there should be none).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import exporter
+from benchmark.fake_server import FakeAsanaServer
+from benchmark.synthetic import SyntheticWorkspace
+
+NETWORK_MODULES = ("asana", "requests", "urllib3", "tqdm", "humanize", "dotenv")
+
+parser = argparse.ArgumentParser(
+            prog="Asana exporter startup benchmark",
+            description="Measures startup time of HTML regeneration from raw responses",
+            )
+parser.add_argument("--runs", type=int, default=5, help="number of runs of every measurement, default=5")
+parser.add_argument("--projects", type=int, default=1, help="default=1")
+parser.add_argument("--tasks", type=int, default=20, help="tasks per project, default=20")
+parser.add_argument("-o", "--output-dir", default="bench_startup/", help="default=./bench_startup/")
+parser.add_argument("--report", help="write results as JSON to this file")
+
+# measured code, run by a fresh interpreter which prints the result as JSON
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import exporter
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "network_modules": [m for m in {modules!r} if m in sys.modules]}}))
+"""
+TEMPLATES_PROBE = """
+import json, time
+import exporter
+start = time.perf_counter()
+exporter.create_templates(cache_dir={cache_dir!r})
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+REGENERATE_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import exporter
+exporter.main(exporter.parser.parse_args({argv!r}))
+print(json.dumps({{"seconds": time.perf_counter() - start, "network_modules": [m for m in {modules!r} if m in sys.modules]}}))
+"""
+
+def create_export(args, output_dir: Path) -> int:
+    """Exports a synthetic workspace (without attachments) from a local fake API, returns number of tasks"""
+    workspace = SyntheticWorkspace(projects=args.projects, tasks=args.tasks, attachments=0)
+    server = FakeAsanaServer(workspace).start()
+    os.environ["ASANA_HOST"] = server.api_url
+    os.environ["ASANA_TOKEN"] = "benchmark"
+    try:
+        cfg = exporter.ExportConfig(
+            api_client=exporter.create_api_client(4),
+            output_dir=output_dir,
+            html_templates=exporter.create_templates(),
+            network=exporter.NetworkOptions(concurrency=4),
+            output=exporter.OutputOptions(download_attachments=False),
+        )
+        asana_exporter = exporter.AsanaExporter(cfg)
+        asana_exporter.getAll()
+        cfg.shutdown()
+        asana_exporter.exportAll()
+        cfg.close()
+    finally:
+        server.stop()
+    return workspace.task_count
+
+def run_probe(code: str) -> dict:
+    """Runs `code` in a new interpreter, returns its result with wall time of the whole process"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = time.perf_counter() - start
+    return result
+
+def measure(name: str, runs: int, code: str, before_run=None) -> dict:
+    results = []
+    for _ in range(runs):
+        if before_run is not None:
+            before_run()
+        results.append(run_probe(code))
+    seconds = [result["seconds"] for result in results]
+    wall = [result["wall_seconds"] for result in results]
+    summary = {
+        "measurement": name,
+        "median_seconds": round(statistics.median(seconds), 4),
+        "min_seconds": round(min(seconds), 4),
+        "median_process_seconds": round(statistics.median(wall), 4),
+    }
+    if "network_modules" in results[-1]:
+        summary["network_modules"] = ",".join(results[-1]["network_modules"]) or "-"
+    return summary
+
+def main(args):
+    logging.basicConfig(level=logging.WARNING)
+    output_dir = Path(args.output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    export_dir = output_dir / "export"
+    cache_dir = output_dir / "template-cache"
+    task_count = create_export(args, export_dir)
+    print(f"Synthetic export: {args.projects} projects, {task_count} tasks (including subtasks)")
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    argv = ["-o", str(export_dir), "--load-local-responses", "--render-processes", "1", "--log-file", os.devnull]
+    results = [
+        measure("import exporter", args.runs, IMPORT_PROBE.format(modules=NETWORK_MODULES)),
+        measure("templates (cold cache)", args.runs, TEMPLATES_PROBE.format(cache_dir=str(cache_dir)), before_run=clear_cache),
+        # the first run fills the cache
+        measure("templates (warm cache)", args.runs, TEMPLATES_PROBE.format(cache_dir=str(cache_dir))),
+        measure("regenerate HTML", args.runs, REGENERATE_PROBE.format(argv=argv, modules=NETWORK_MODULES)),
+    ]
+    for result in results:
+        print(" ".join(f"{key}={value}" for key, value in result.items()))
+    if args.report:
+        with open(args.report, mode="w") as f:
+            json.dump({"config": vars(args), "task_count": task_count, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,169 @@
+import random
+
+# Generator of synthetic Asana workspaces - responses have the same shape as responses of Asana API
+# Attachments do not contain download_url, it is filled in by the server serving them.
+
+WORDS = ["design", "review", "release", "budget", "meeting", "report", "client", "draft", "update", "plan",
+         "check", "fix", "invoice", "launch", "sprint", "backlog", "copy", "banner", "survey", "contract"]
+
+class SyntheticWorkspace:
+    """All entities of one generated workspace indexed by gid of their parent"""
+    def __init__(self, projects: int = 5, tasks: int = 100, subtasks: int = 2, depth: int = 1,
+                 stories: int = 5, attachments: int = 1, attachment_size: int = 100_000, seed: int = 0):
+        self._random = random.Random(seed)
+        self._gid = 1000
+        self.workspaces = [{"gid": self.next_gid(), "name": "Synthetic workspace", "resource_type": "workspace", "is_organization": False}]
+        self.projects = {}
+        self.tasks = {}
+        self.subtasks = {}
+        self.stories = {}
+        self.attachments = {}
+        # attachment gid -> size in bytes
+        self.attachment_sizes = {}
+        # task gid -> task (including subtasks)
+        self.task_index = {}
+        # project gid -> events of the project (see change methods below)
+        self.events = {}
+        self.task_count = 0
+        ws = self.workspaces[0]
+        self.projects[ws["gid"]] = []
+        for p in range(projects):
+            project = self.project(ws, p)
+            self.projects[ws["gid"]].append(project)
+            self.tasks[project["gid"]] = [
+                self.task(project, None, t, depth, subtasks, stories, attachments, attachment_size)
+                for t in range(tasks)
+            ]
+
+    def next_gid(self) -> str:
+        self._gid += 1
+        return str(self._gid)
+
+    def words(self, count: int) -> str:
+        return " ".join(self._random.choice(WORDS) for _ in range(count))
+
+    def project(self, ws: dict, index: int) -> dict:
+        return {
+            "gid": self.next_gid(),
+            "resource_type": "project",
+            "name": f"Project {index} {self.words(2)}",
+            "archived": index % 10 == 9,
+            "color": "light-green",
+            "modified_at": "2024-01-01T00:00:00.000Z",
+            "workspace": {"gid": ws["gid"], "name": ws["name"]},
+        }
+
+    def task(self, project: dict, parent: dict | None, index: int, depth: int, subtasks: int, stories: int, attachments: int, attachment_size: int) -> dict:
+        gid = self.next_gid()
+        self.task_count += 1
+        task_subtasks = subtasks if depth > 0 else 0
+        completed = self._random.random() < 0.5
+        task = {
+            "gid": gid,
+            "resource_type": "task",
+            "name": f"{self.words(3)} {index}",
+            "completed": completed,
+            "completed_at": "2023-06-01T00:00:00.000Z" if completed else None,
+            "due_at": None,
+            "due_on": "2024-02-01",
+            "followers": [{"gid": "1", "name": "Synthetic user"}],
+            "html_notes": f"<body>{self.words(30)}</body>",
+            "num_subtasks": task_subtasks,
+            "tags": [],
+            "memberships": [{"project": {"gid": project["gid"], "name": project["name"]}, "section": {"gid": "2", "name": "Untitled section"}}],
+            "modified_at": "2024-01-01T00:00:00.000Z",
+            "parent": {"gid": parent["gid"], "name": parent["name"]} if parent is not None else None,
+        }
+        self.task_index[gid] = task
+        self.stories[gid] = [self.story(i) for i in range(stories)]
+        self.attachments[gid] = [self.attachment(i, attachment_size) for i in range(attachments)]
+        self.subtasks[gid] = [
+            self.task(project, task, i, depth - 1, subtasks, stories, attachments, attachment_size)
+            for i in range(task_subtasks)
+        ]
+        return task
+
+    def story(self, index: int) -> dict:
+        comment = index % 2 == 1
+        return {
+            "gid": self.next_gid(),
+            "resource_type": "story",
+            "type": "comment" if comment else "system",
+            "resource_subtype": "comment_added" if comment else "assigned",
+            "created_at": f"2024-01-01T00:00:{index % 60:02d}.000Z",
+            "created_by": {"gid": "1", "name": "Synthetic user"},
+            "html_text": f"<body>{self.words(20)}</body>",
+            "likes": [],
+        }
+
+    def attachment(self, index: int, size: int) -> dict:
+        gid = self.next_gid()
+        self.attachment_sizes[gid] = size
+        return {
+            "gid": gid,
+            "resource_type": "attachment",
+            "name": f"attachment-{index}.bin",
+            "resource_subtype": "asana",
+            "created_at": "2024-01-01T00:00:00.000Z",
+            "size": size,
+            "download_url": None,
+            "view_url": None,
+        }
+
+    # Changes of the workspace, each of them is recorded as an event of the project
+
+    def event(self, project_gid: str, resource: dict, action: str, parent: dict = None):
+        self.events.setdefault(project_gid, []).append({
+            "action": action,
+            "created_at": "2024-01-02T00:00:00.000Z",
+            "resource": {"gid": resource["gid"], "resource_type": resource["resource_type"], "name": resource.get("name")},
+            "parent": {"gid": parent["gid"], "resource_type": parent["resource_type"], "name": parent.get("name")} if parent is not None else None,
+            "type": resource["resource_type"],
+            "user": {"gid": "1", "name": "Synthetic user"},
+        })
+
+    def project_of(self, task: dict) -> str:
+        return task["memberships"][0]["project"]["gid"]
+
+    def rename_task(self, gid: str, name: str):
+        task = self.task_index[gid]
+        task["name"] = name
+        task["modified_at"] = "2024-01-02T00:00:00.000Z"
+        self.event(self.project_of(task), task, "changed")
+
+    def add_comment(self, gid: str) -> dict:
+        task = self.task_index[gid]
+        story = self.story(len(self.stories[gid]) * 2 + 1)
+        self.stories[gid].append(story)
+        self.event(self.project_of(task), story, "added", parent=task)
+        return story
+
+    def find_project(self, gid: str) -> dict:
+        return next(prj for projects in self.projects.values() for prj in projects if prj["gid"] == gid)
+
+    def add_task(self, project_gid: str) -> dict:
+        project = self.find_project(project_gid)
+        task = self.task(project, None, len(self.tasks[project_gid]), 0, 0, 1, 0, 0)
+        self.tasks[project_gid].append(task)
+        self.event(project_gid, task, "added", parent=project)
+        return task
+
+    def add_subtask(self, gid: str) -> dict:
+        parent = self.task_index[gid]
+        project_gid = self.project_of(parent)
+        subtask = self.task(self.find_project(project_gid), parent, len(self.subtasks[gid]), 0, 0, 1, 0, 0)
+        self.subtasks[gid].append(subtask)
+        parent["num_subtasks"] += 1
+        parent["modified_at"] = "2024-01-02T00:00:00.000Z"
+        self.event(project_gid, subtask, "added", parent=parent)
+        # Asana reports further changes of the subtask without its parent
+        self.event(project_gid, subtask, "changed")
+        return subtask
+
+    def delete_task(self, gid: str):
+        task = self.task_index.pop(gid)
+        project_gid = self.project_of(task)
+        parent = task["parent"]
+        siblings = self.subtasks[parent["gid"]] if parent is not None else self.tasks[project_gid]
+        siblings.remove(task)
+        self.event(project_gid, task, "deleted")
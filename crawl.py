@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from lazy import lazy_import
+from metrics import Metrics
+
+if TYPE_CHECKING:
+    from exporter import Task
+
+# Requests to Asana API made by the crawl
+#
+# Crawl jobs run on a bounded thread pool (CrawlScheduler), a 429 response pauses all workers
+# (RateLimiter), small concurrent requests can be grouped into batch API calls (BatchCoalescer)
+# and requests that can only return an empty result are skipped (RequestPlanner).
+
+asana = lazy_import("asana")
+asana_rest = lazy_import("asana.rest")
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Shared back-off for all crawl workers
+
+    When Asana answers with 429, every worker waits until the Retry-After period is over,
+    not just the one that received the response.
+    """
+    def __init__(self, max_retries: int = 5, default_delay: float = 30.0, metrics: Metrics = None):
+        self.max_retries = max_retries
+        self.default_delay = default_delay
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+    
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+    
+    def backoff(self, delay: float):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+    
+    def retry_after(self, e: 'asana_rest.ApiException') -> float:
+        value = e.headers.get("Retry-After") if e.headers else None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return self.default_delay
+    
+    def call(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.wait()
+            try:
+                return fn(*args, **kwargs)
+            except asana_rest.ApiException as e:
+                if e.status != 429 or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = self.retry_after(e)
+                logger.warning(f"rate limited - pausing all requests for {delay}s (retry {attempt}/{self.max_retries})")
+                if self.metrics is not None:
+                    self.metrics.retry()
+                self.backoff(delay)
+    
+    def paginate(self, request, opts: dict) -> list:
+        """Fetches all items of a paginated listing, `request(opts)` returns one page (full payload)
+
+        Every page is retried on its own, so a rate limited request does not repeat the pages fetched before it.
+        """
+        opts = dict(opts)
+        items = []
+        while True:
+            page = self.call(request, opts)
+            items += page.get("data") or []
+            next_page = page.get("next_page")
+            if not next_page:
+                return items
+            opts["offset"] = next_page["offset"]
+
+class CrawlScheduler:
+    """Runs crawl jobs on a bounded thread pool
+
+    Jobs may submit further jobs (e.g. a task submits its subtasks), `join` waits until
+    there is no pending job left.
+    """
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="crawl")
+        self._pending = 0
+        self._cond = threading.Condition()
+        # number of jobs that raised an exception
+        self.failed = 0
+    
+    def submit(self, fn, *args):
+        with self._cond:
+            self._pending += 1
+        self.executor.submit(self._run, fn, *args)
+    
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception(f"crawl job {fn} failed")
+            with self._cond:
+                self.failed += 1
+        finally:
+            with self._cond:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._cond.notify_all()
+    
+    def join(self):
+        with self._cond:
+            while self._pending > 0:
+                self._cond.wait()
+    
+    def shutdown(self):
+        self.join()
+        self.executor.shutdown()
+
+class BatchCoalescer:
+    """Groups small GET requests of concurrent crawl workers into Asana batch API calls
+
+    Requests are collected for `linger` seconds (or until `max_actions` are queued) and sent
+    as one POST /batch. `get` returns None when the action failed or when the result has more
+    than one page, the caller then falls back to the regular request.
+    """
+    # limit of the Asana batch API
+    max_actions = 10
+    def __init__(self, api_client, rate_limiter: RateLimiter, metrics: Metrics, max_workers: int = 4, linger: float = 0.05):
+        self.api_instance = asana.BatchAPIApi(api_client)
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.linger = linger
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="batch")
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._collect, name="batch-collector", daemon=True)
+        self._thread.start()
+    
+    def get(self, relative_path: str, opts: dict, params: dict = None) -> list | None:
+        options = {}
+        if "limit" in opts:
+            options["limit"] = opts["limit"]
+        if "opt_fields" in opts:
+            options["fields"] = opts["opt_fields"].split(",")
+        action = {"relative_path": relative_path, "method": "get", "options": options}
+        if params:
+            action["data"] = params
+        future = Future()
+        with self._cond:
+            if self._closed:
+                return None
+            self._queue.append((action, future))
+            self._cond.notify_all()
+        return future.result()
+    
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._queue:
+                    return
+                deadline = time.monotonic() + self.linger
+                while len(self._queue) < self.max_actions and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[:self.max_actions]
+                del self._queue[:self.max_actions]
+            self.executor.submit(self._send, batch)
+    
+    def _send(self, batch: list):
+        body = {"data": {"actions": [action for action, _ in batch]}}
+        try:
+            with self.metrics.track("create_batch_request", fallback=True):
+                response = self.rate_limiter.call(self.api_instance.create_batch_request, body, {}, full_payload=True)
+            results = response["data"] if isinstance(response, dict) else response
+        except Exception as e:
+            logger.warning(f"batch request failed - falling back to individual requests: {e}")
+            results = []
+        for i, (action, future) in enumerate(batch):
+            result = results[i] if i < len(results) else {}
+            result_body = result.get("body") or {}
+            if result.get("status_code") != 200 or result_body.get("next_page"):
+                logger.debug(f"batch action {action['relative_path']} not usable ({result.get('status_code')}) - falling back")
+                future.set_result(None)
+            else:
+                future.set_result(result_body.get("data", []))
+    
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.executor.shutdown()
+
+class RequestPlanner:
+    """Skips requests that can only return an empty result
+
+    Decisions are based on counts that are already part of fetched data
+    (e.g. `num_subtasks` from task listing).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.skipped = {}
+    
+    def skip(self, endpoint: str):
+        with self._lock:
+            self.skipped[endpoint] = self.skipped.get(endpoint, 0) + 1
+    
+    def need_subtasks(self, task: 'Task') -> bool:
+        if task.num_subtasks == 0:
+            self.skip("get_subtasks_for_task")
+            return False
+        return True
+    
+    def report(self):
+        total = sum(self.skipped.values())
+        details = ", ".join(f"{endpoint}: {count}" for endpoint, count in sorted(self.skipped.items()))
+        logger.info(f"skipped {total} requests with empty result ({details})")
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lazy import lazy_import
+from metrics import Metrics
+
+if TYPE_CHECKING:
+    from exporter import Attachment
+
+# Downloads of attachments - running next to the crawl on their own thread pool,
+# optionally through a content-addressed pool that stores every distinct file once (--dedupe-attachments)
+
+requests = lazy_import("requests")
+tqdm = lazy_import("tqdm")
+humanize = lazy_import("humanize")
+
+logger = logging.getLogger(__name__)
+
+class AttachmentDownloader:
+    """Downloads attachments on its own thread pool while the crawl continues
+
+    All downloads share one keep-alive HTTP session and one aggregate progress bar.
+    """
+    def __init__(self, max_workers: int, metrics: Metrics):
+        max_workers = max(1, max_workers)
+        self.metrics = metrics
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=3)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self._lock = threading.Lock()
+        self.progress = tqdm.tqdm(total=0, unit="B", unit_scale=True, desc="Attachments", delay=1)
+    
+    def submit(self, atch: 'Attachment'):
+        if atch.size:
+            with self._lock:
+                self.progress.total += atch.size
+                self.progress.refresh()
+        self.executor.submit(self._download, atch)
+    
+    def _download(self, atch: 'Attachment'):
+        start = time.perf_counter()
+        try:
+            size = atch.save(session=self.session, progress=self.update)
+            self.metrics.download(size, time.perf_counter() - start)
+        except Exception:
+            self.metrics.download(0, time.perf_counter() - start, failed=True)
+            logger.exception(f"{atch} download failed")
+    
+    def update(self, n: int):
+        with self._lock:
+            self.progress.update(n)
+    
+    def shutdown(self):
+        self.executor.shutdown()
+        self.progress.close()
+        self.session.close()
+
+class AttachmentPool:
+    """Content-addressed store of downloaded attachments
+
+    Every distinct content is stored once in `<dir>/<sha256[:2]>/<sha256>` and hardlinked
+    (or copied when hardlinks are not supported) to the attachment directories of tasks.
+    Hashes of already downloaded attachment gids are kept in an append-only index,
+    so an attachment that is already in the pool is not downloaded again.
+    """
+    dirname = "_blobs"
+    index_filename = "index"
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._gid_locks = {}
+        # attachment gid -> sha256 of its content
+        self.index = {}
+        self.stats = {"linked": 0, "duplicates": 0, "saved_bytes": 0}
+        index_path = self.path / self.index_filename
+        if index_path.exists():
+            with open(index_path, encoding="utf-8") as f:
+                for line in f:
+                    # last line may be cut off by a crash
+                    if line.endswith("\n"):
+                        gid, digest = line.split()
+                        self.index[gid] = digest
+        self._index_file = open(index_path, mode="a", encoding="utf-8")
+    
+    def blob_path(self, digest: str) -> Path:
+        return self.path / digest[:2] / digest
+    
+    def gid_lock(self, gid: str) -> threading.Lock:
+        # the same attachment can be saved for several projects at once
+        with self._lock:
+            return self._gid_locks.setdefault(gid, threading.Lock())
+    
+    def record(self, gid: str, digest: str):
+        with self._lock:
+            self.index[gid] = digest
+            self._index_file.write(f"{gid} {digest}\n")
+            self._index_file.flush()
+    
+    @staticmethod
+    def link(blob: Path, target: Path):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            if target.samefile(blob):
+                return
+            target.unlink()
+        try:
+            os.link(blob, target)
+        except OSError:
+            shutil.copyfile(blob, target)
+    
+    def save(self, atch: 'Attachment', target: Path, session: 'requests.Session', progress) -> int:
+        """Saves attachment to `target` through the pool, returns number of downloaded bytes"""
+        with self.gid_lock(atch.gid):
+            digest = self.index.get(atch.gid)
+            if digest is not None:
+                blob = self.blob_path(digest)
+                if blob.exists() and (atch.size is None or blob.stat().st_size == atch.size):
+                    logger.debug(f"{atch} already in attachment pool - skipping download")
+                    self.link(blob, target)
+                    progress(atch.size or 0)
+                    with self._lock:
+                        self.stats["linked"] += 1
+                        self.stats["saved_bytes"] += blob.stat().st_size
+                    return 0
+            part_path = self.path / "tmp" / f"{atch.gid}.part"
+            downloaded = atch.download(part_path, session, progress)
+            with open(part_path, mode="rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            blob = self.blob_path(digest)
+            if blob.exists():
+                # same content was already downloaded for another attachment
+                with self._lock:
+                    self.stats["duplicates"] += 1
+                    self.stats["saved_bytes"] += blob.stat().st_size
+                part_path.unlink()
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                part_path.replace(blob)
+            self.record(atch.gid, digest)
+            self.link(blob, target)
+            return downloaded
+    
+    def close(self):
+        self._index_file.close()
+        logger.info(f"attachment pool: {self.stats['linked']} attachments reused without download, {self.stats['duplicates']} duplicate downloads, {humanize.naturalsize(self.stats['saved_bytes'], binary=True)} of disk space saved")
@@ -1,24 +1,46 @@
-import asana
-from asana.rest import ApiException
 from pprint import pprint
 import os
-from dotenv import load_dotenv
 from typing import Self, Type
 import json
 from pathlib import Path
 from slugify import slugify
-import requests
-from tqdm import tqdm
-import humanize
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from fields import FIELD_PROFILES, DEFAULT_PROFILE
+import snapshot
+import shards
+from store import SqliteStore
+from metrics import Metrics, METRICS_FILE
+from search import SearchIndexBuilder, SEARCH_DIR
+from crawl import RateLimiter, CrawlScheduler, BatchCoalescer, RequestPlanner
+from downloads import AttachmentDownloader, AttachmentPool
+from state import Manifest, Journal, FileNames, SYNC_TOKENS_FILE
+from profiling import Profiler, profiled, PROFILE_DIR
+from output import open_output, open_input
+from lazy import lazy_import
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
 import logging
 import re
 import locale
 import argparse
+import threading
+import multiprocessing
+import shutil
+import fnmatch
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+# network-only dependencies are loaded on first use, regenerating HTML from raw responses does not need them
+asana = lazy_import("asana")
+asana_rest = lazy_import("asana.rest")
+requests = lazy_import("requests")
+urllib3 = lazy_import("urllib3")
+humanize = lazy_import("humanize")
+dotenv = lazy_import("dotenv")
 
 parser = argparse.ArgumentParser(
             prog="Asana exporter",
             description="Exports all workspaces you are part of to HTML",
+            epilog="Run 'exporter.py serve -h' to see parameters of the local web server serving an existing export.",
             )
 parser.add_argument("-d", "--download-attachments", type=bool, default=True, help="default=True")
 parser.add_argument("-r", "--save-raw-responses", type=bool, default=True, help="default=True")
@@ -26,120 +48,606 @@ parser.add_argument("-e", "--export-html", type=bool, default=True, help="defaul
 parser.add_argument("-o", "--output-dir", default="out/", help="default=./out/")
 parser.add_argument("-s", "--separate-responses", action='store_true', help="store HTML and json files in separate directories")
 parser.add_argument("--load-local-responses", action='store_true', help="load raw responses from previous runs")
+parser.add_argument("--snapshot", action='store_true', help="store raw responses in packed snapshot (one file per project) and load them from it")
+parser.add_argument("--sqlite", help="store raw responses in given SQLite database instead of json files")
+parser.add_argument("--archive", help="write all output files (raw responses, HTML files and attachments) into given .zip or .tar.zst archive instead of output directory (.tar.zst needs the optional zstandard package)")
+parser.add_argument("--load-archive", help="load raw responses from given archive created by --archive (implies --load-local-responses)")
+parser.add_argument("--include-project", action='append', help="export only projects with given gid or name matching given pattern (e.g. 'Marketing*', can be repeated)")
+parser.add_argument("--exclude-project", action='append', help="do not export projects with given gid or name matching given pattern (can be repeated)")
+parser.add_argument("--skip-archived", action='store_true', help="do not export archived projects")
+parser.add_argument("--completed-since", help="export only incomplete tasks and tasks completed since given date-time (e.g. 2024-01-01T00:00:00Z)")
+parser.add_argument("--include-section", action='append', help="export only tasks in sections with given gid or name matching given pattern (can be repeated)")
+parser.add_argument("--exclude-section", action='append', help="do not export tasks in sections with given gid or name matching given pattern (can be repeated)")
+parser.add_argument("--only-project", action='append', help="with --load-local-responses load and export only project with given gid (can be repeated)")
+parser.add_argument("--shard", help="export only projects of shard i/N (e.g. 2/4) - shards can run as separate processes or on separate hosts writing into the same output directory")
+parser.add_argument("--merge-shards", action='store_true', help="render overview and workspace pages and search index of an export made by --shard")
+parser.add_argument("--streaming", action='store_true', help="fetch (or load), save and export one project at a time to limit memory usage")
 parser.add_argument("-l", "--locale", help="set locale - needed for locale aware sorting")
 parser.add_argument("--log-file", default="app.log")
+parser.add_argument("-j", "--jobs", type=int, default=8, help="number of concurrent API requests, default=8")
+parser.add_argument("-i", "--incremental", action='store_true', help="reuse raw responses of tasks that were not modified since the previous export")
+parser.add_argument("--resume", action='store_true', help="continue interrupted export - entities fetched by the previous run are loaded from raw responses")
+parser.add_argument("-b", "--batch-requests", action='store_true', help="group requests of concurrently fetched tasks into Asana batch API calls")
+parser.add_argument("--fields", choices=FIELD_PROFILES.keys(), default=DEFAULT_PROFILE, help=f"set of fields requested from Asana API, default={DEFAULT_PROFILE}")
+parser.add_argument("--render-processes", type=int, default=os.cpu_count(), help="number of processes rendering HTML, default=number of CPUs")
+parser.add_argument("--download-jobs", type=int, default=4, help="number of concurrent attachment downloads, default=4")
+parser.add_argument("--dedupe-attachments", action='store_true', help="store attachment contents once (by hash) and hardlink them into task directories")
+parser.add_argument("--page-size", type=int, default=100, help="number of tasks on one page of project and subtask listings (0 = no pagination), default=100")
+parser.add_argument("--no-search-index", action='store_true', help="do not generate search index and search page")
+parser.add_argument("--sync", action='store_true', help="keep running and update the export using Asana events (only changed tasks are fetched and rendered again)")
+parser.add_argument("--sync-interval", type=float, default=60, help="seconds between two syncs with --sync, default=60")
+parser.add_argument("--metrics-prom", help="also write metrics of API requests and downloads to given file in Prometheus text format")
+parser.add_argument("--profile", action='store_true', help="write CPU profiles and memory usage of phases of the run into <output_dir>/profile/ (makes the run slower)")
+parser.add_argument("--profile-project", help="with --profile profile only phases done for project with given gid")
 
 logger = logging.getLogger(__name__)
 
 default_base_path = Path("out/")
 
-class ExportConfig:
-    def __init__(self, api_client, output_dir: Path|str, save_raw:bool, separate_raw: bool, export_html: bool, download_attachments: bool, html_templates: list):
-        self.api_client = api_client
-        self.save_raw = save_raw
+class ListingPage:
+    """One page of a paginated listing of child entities
+
+    The first page is part of the parent page (`first_filename`), the other pages
+    are `<prefix><number>.html` in the same directory.
+    """
+    __slots__ = ("items", "number", "count", "prefix", "first_filename")
+    def __init__(self, items: list, number: int, count: int, prefix: str, first_filename: str = "index.html"):
+        self.items = items
+        self.number = number
+        self.count = count
+        self.prefix = prefix
+        self.first_filename = first_filename
+    
+    def filename(self, number: int = None) -> str:
+        if number is None:
+            number = self.number
+        return self.first_filename if number == 1 else f"{self.prefix}{number}.html"
+
+def paginate(items: list, page_size: int, prefix: str) -> list[ListingPage]:
+    """Splits (already sorted) items into pages, there is always at least one (possibly empty) page"""
+    if page_size <= 0 or len(items) <= page_size:
+        return [ListingPage(items, 1, 1, prefix)]
+    count = (len(items) + page_size - 1) // page_size
+    return [ListingPage(items[i * page_size:(i + 1) * page_size], i + 1, count, prefix) for i in range(count)]
+
+def remove_stale_pages(output, path: Path, prefix: str, count: int):
+    """Removes listing pages left from a previous export that had more pages"""
+    for page_file in output.list_files(path, f"{prefix}*.html"):
+        number = page_file.stem[len(prefix):]
+        if number.isdigit() and int(number) > count:
+            output.remove(page_file)
+
+class ExportScope:
+    """Selects projects and tasks to export, filtered entities are not saved and their children are not requested
+
+    Project and section patterns are gids or shell-style wildcards matched against names (case-insensitive).
+    """
+    def __init__(self, include_projects: list[str] = None, exclude_projects: list[str] = None, skip_archived: bool = False, completed_since: str = None, include_sections: list[str] = None, exclude_sections: list[str] = None):
+        self.include_projects = include_projects or []
+        self.exclude_projects = exclude_projects or []
+        self.skip_archived = skip_archived
+        # passed to the task listing of projects - only incomplete tasks and tasks completed since then are returned
+        self.completed_since = completed_since
+        self.include_sections = include_sections or []
+        self.exclude_sections = exclude_sections or []
+        self._lock = threading.Lock()
+        self.skipped = {"projects": 0, "tasks": 0}
+    
+    @staticmethod
+    def matches(patterns: list[str], gid: str, name: str) -> bool:
+        name = (name or "").casefold()
+        return any(pattern == gid or fnmatch.fnmatchcase(name, pattern.casefold()) for pattern in patterns)
+    
+    def skip(self, kind: str):
+        with self._lock:
+            self.skipped[kind] += 1
+    
+    def include_project(self, data: dict) -> bool:
+        if (self.skip_archived and data.get("archived")) \
+                or (self.include_projects and not self.matches(self.include_projects, data["gid"], data.get("name"))) \
+                or self.matches(self.exclude_projects, data["gid"], data.get("name")):
+            self.skip("projects")
+            return False
+        return True
+    
+    def include_task(self, project_gid: str, data: dict) -> bool:
+        """Applies section filters to a task of the project (using its memberships)"""
+        if not self.include_sections and not self.exclude_sections:
+            return True
+        sections = [membership["section"] for membership in data.get("memberships") or []
+                    if (membership.get("project") or {}).get("gid") == project_gid and membership.get("section")]
+        if (self.include_sections and not any(self.matches(self.include_sections, sec["gid"], sec.get("name")) for sec in sections)) \
+                or any(self.matches(self.exclude_sections, sec["gid"], sec.get("name")) for sec in sections):
+            self.skip("tasks")
+            return False
+        return True
+    
+    def report(self):
+        if self.skipped["projects"] or self.skipped["tasks"]:
+            logger.info(f"out of scope: {self.skipped['projects']} projects, {self.skipped['tasks']} tasks")
+
+class SlugRegistry:
+    """File names used in one directory
+
+    When two entities slugify to the same name, the one that did not have the name before
+    gets its gid appended instead of overwriting files of the other one. Names from previous
+    runs (`file_names`) are reserved for their entities, so they do not depend on the order
+    in which the entities are fetched.
+    """
+    def __init__(self, reserved: tuple = (), file_names: FileNames = None, scope: str = "", key: str = ""):
+        self._lock = threading.Lock()
+        self.file_names = file_names
+        self.scope = scope
+        self.key = key
+        # gid -> name from previous runs
+        self._previous = file_names.get(scope, key) if file_names is not None else {}
+        # lowercase names, so the names are unique also on case-insensitive file systems
+        self._names = {name.lower(): gid for gid, name in self._previous.items()}
+        self._names.update({name.lower(): None for name in reserved})
+    
+    def register(self, entity: 'SavableHierEntity', slug: str, suffixed: str = None) -> str:
+        """Returns file name for `entity`, `suffixed` is the name used when `slug` is taken (`<slug>-<gid>` by default)"""
+        if suffixed is None:
+            suffixed = f"{slug}-{entity.gid}"
+        with self._lock:
+            previous = self._previous.get(entity.gid)
+            if previous is not None and previous.lower() in (slug.lower(), suffixed.lower()) and self._names.get(previous.lower()) == entity.gid:
+                name = previous
+            elif self._names.get(slug.lower(), entity.gid) == entity.gid:
+                name = slug
+            else:
+                name = suffixed
+                logger.warning(f"{entity.kind} {entity.gid}: name \"{slug}\" is already used in the same directory - using \"{name}\"")
+            if previous is not None and previous != name and self._names.get(previous.lower()) == entity.gid:
+                # entity was renamed, its previous name is free again
+                del self._names[previous.lower()]
+            self._names[name.lower()] = entity.gid
+            self._previous[entity.gid] = name
+            if self.file_names is not None and not entity.unique_names:
+                self.file_names.record(self.scope, self.key, entity.gid, name)
+            return name
+    
+    def release(self, name: str):
+        with self._lock:
+            gid = self._names.pop(name.lower(), None)
+            if gid is not None and self.file_names is not None:
+                self.file_names.forget(self.scope, self.key, gid)
+
+class SiteConfig:
+    """Paths, templates and page layout of an export - enough to load raw json responses and render pages
+
+    `ExportConfig` adds everything needed to fetch and write an export, `exporter.py serve` uses only this.
+    """
+    # SQLite store of raw responses and file names of previous runs are used only by the exporter
+    store = None
+    file_names = None
+    # (i, N) when only projects of shard i of N are exported
+    shard = None
+    def __init__(self, output_dir: Path|str, separate_raw: bool, html_templates: dict, search_index: bool = True, page_size: int = 100):
         if isinstance(output_dir, str):
             output_dir = Path(output_dir)
+        self.output_dir = output_dir
         if separate_raw:
             self.raw_base_path = output_dir / "json"
             self.html_base_path = output_dir / "html"
         else:
             self.raw_base_path = output_dir
             self.html_base_path = output_dir
+        self.raw_input = open_input(None, output_dir)
+        self.html_templates = html_templates
+        self.search_index = search_index
+        self.page_size = page_size
+        self.scope = ExportScope()
+        self.root_slugs = self.create_root_slugs()
+    
+    def create_root_slugs(self) -> SlugRegistry:
+        """Registry of file names of workspaces (top level directory)"""
+        return SlugRegistry(reserved=(snapshot.SNAPSHOT_DIR, Path(METRICS_FILE).stem, AttachmentPool.dirname, SEARCH_DIR, shards.SHARDS_DIR, PROFILE_DIR), file_names=self.file_names)
+    
+    def in_shard(self, gid: str) -> bool:
+        """True if project with `gid` is exported by this process"""
+        return self.shard is None or shards.shard_of(gid, self.shard[1]) == self.shard[0]
+
+class NetworkOptions:
+    """How data are fetched from Asana (see `ExportConfig`)"""
+    def __init__(self, concurrency: int = 1, download_concurrency: int = 1, batch_requests: bool = False, fields_profile: str = DEFAULT_PROFILE):
+        self.concurrency = concurrency
+        self.download_concurrency = download_concurrency
+        self.batch_requests = batch_requests
+        self.fields_profile = fields_profile
+
+class StateOptions:
+    """State kept in the output directory between runs (see `ExportConfig`)"""
+    def __init__(self, incremental: bool = False, resume: bool = False, sqlite_path: Path|str = None, shard: tuple[int, int] = None):
+        self.incremental = incremental
+        self.resume = resume
+        self.sqlite_path = sqlite_path
+        # (i, N) when only projects of shard i of N are exported
+        self.shard = shard
+
+class OutputOptions:
+    """What is written and where (see `ExportConfig`)"""
+    def __init__(self, save_raw: bool = True, separate_raw: bool = False, export_html: bool = True, download_attachments: bool = True, render_processes: int = 1, release_raw_data: bool = False, dedupe_attachments: bool = False, search_index: bool = True, page_size: int = 100, archive_path: Path|str = None, input_archive_path: Path|str = None):
+        self.save_raw = save_raw
+        self.separate_raw = separate_raw
         self.export_html = export_html
         self.download_attachments = download_attachments
-        self.html_templates = html_templates
+        self.render_processes = render_processes
+        # raw responses are dropped from memory after they are saved
+        self.release_raw_data = release_raw_data
+        self.dedupe_attachments = dedupe_attachments
+        self.search_index = search_index
+        self.page_size = page_size
+        self.archive_path = archive_path
+        self.input_archive_path = input_archive_path
+
+class ExportConfig(SiteConfig):
+    def __init__(self, api_client, output_dir: Path|str, html_templates: dict, network: NetworkOptions = None, state: StateOptions = None, output: OutputOptions = None, scope: ExportScope = None, profiler: Profiler = None):
+        network = network if network is not None else NetworkOptions()
+        state = state if state is not None else StateOptions()
+        output = output if output is not None else OutputOptions()
+        super().__init__(output_dir, output.separate_raw, html_templates, search_index=output.search_index and output.export_html, page_size=output.page_size)
+        self.api_client = api_client
+        # raw responses are dropped from memory after they are saved
+        self.release_raw_data = output.release_raw_data
+        self.store = SqliteStore(state.sqlite_path) if state.sqlite_path is not None else None
+        self.render_processes = output.render_processes
+        self.render_stats = {"written": 0, "unchanged": 0}
+        self.opt_fields = FIELD_PROFILES[network.fields_profile]
+        self.metrics = Metrics()
+        if api_client is not None:
+            self.metrics.instrument(api_client.rest_client)
+        self.rate_limiter = RateLimiter(metrics=self.metrics)
+        self.scheduler = CrawlScheduler(network.concurrency)
+        self.planner = RequestPlanner()
+        # CPU and memory profile of the run (--profile)
+        self.profiler = profiler
+        self.scope = scope if scope is not None else ExportScope()
+        self.batcher = BatchCoalescer(api_client, self.rate_limiter, self.metrics) if network.batch_requests and api_client is not None else None
+        self.downloader = AttachmentDownloader(network.download_concurrency, self.metrics) if output.download_attachments else None
+        self.save_raw = output.save_raw
+        # files are written to output directory or into an archive, raw responses are read from either of them
+        self.output = open_output(output.archive_path, self.output_dir)
+        self.raw_input = open_input(output.input_archive_path, self.output_dir)
+        incremental, resume, dedupe_attachments = state.incremental, state.resume, output.dedupe_attachments
+        if self.output.archive:
+            if self.render_processes > 1:
+                # worker processes cannot write into the archive of the main process
+                self.render_processes = 1
+            for enabled, option in ((incremental, "incremental export"), (resume, "resuming"), (dedupe_attachments, "attachment deduplication")):
+                if enabled:
+                    logger.warning(f"{option} is not supported with archive output - ignoring")
+            incremental = resume = dedupe_attachments = False
+        self.attachment_pool = AttachmentPool(self.html_base_path / AttachmentPool.dirname) if dedupe_attachments and output.download_attachments else None
+        self.export_html = output.export_html
+        self.download_attachments = output.download_attachments
+        self.shard = state.shard
+        # every shard has its own state files (manifest, journal, file names)
+        self.state_suffix = "." + shards.shard_name(*self.shard) if self.shard is not None else ""
+        # file names assigned in previous runs into the same output directory
+        self.file_names = FileNames(self.raw_base_path / (FileNames.dirname + self.state_suffix)) if not self.output.archive else None
+        self.root_slugs = self.create_root_slugs()
+        self.manifest = None
+        if incremental:
+            if self.save_raw:
+                self.manifest = Manifest(self.raw_base_path / (Manifest.filename + self.state_suffix))
+            else:
+                logger.warning("incremental export needs raw responses to be saved - ignoring")
+        self.resume = resume
+        # opened when fetching from API starts
+        self.journal = None
+        # set when fetching of some entity gives up, data of this run are incomplete
+        self.incomplete = False
+    
+    def open_journal(self):
+        # interrupted archive cannot be resumed
+        if self.output.archive:
+            return
+        if not self.save_raw:
+            if self.resume:
+                logger.warning("resuming needs raw responses to be saved - ignoring")
+            return
+        self.journal = Journal(self.raw_base_path / (Journal.filename + self.state_suffix), store=self.store, resume=self.resume)
+    
+    def metrics_path(self) -> Path:
+        if self.shard is None:
+            return self.output_dir / METRICS_FILE
+        return shards.state_path(self.output_dir, *self.shard, suffix=".metrics.json")
+    
+    def close_journal(self):
+        """Removes the journal if all data were fetched, otherwise keeps it for `--resume`"""
+        if self.journal is None:
+            return
+        if self.downloader is not None:
+            # failed downloads are missing data as well
+            self.downloader.shutdown()
+        if not self.incomplete and self.scheduler.failed == 0 and self.metrics.downloads["failed"] == 0:
+            self.journal.complete()
+        else:
+            self.journal.close()
+            logger.warning("some requests failed - run again with --resume to fetch only the missing data")
+        self.journal = None
+
+    def shutdown(self):
+        """Waits for all crawl jobs and downloads to finish"""
+        self.scheduler.shutdown()
+        if self.batcher is not None:
+            self.batcher.shutdown()
+        if self.downloader is not None:
+            self.downloader.shutdown()
+        if self.attachment_pool is not None:
+            self.attachment_pool.close()
+        if self.store is not None:
+            self.store.flush()
+    
+    def close(self):
+        """Finishes all outputs, must be called after the export"""
+        if self.store is not None:
+            self.store.close()
+        self.output.close()
+        self.raw_input.close()
 
 class SavableHierEntity:
+    __slots__ = ("cfg", "gid", "name", "parent", "raw_data", "_filename", "_paths", "_child_slugs")
+    # subdirectory of parent directory where entities of this type are stored
+    save_dir = None
+    # names that cannot be used by child entities (subdirectories of this entity)
+    reserved_names = ()
+    # names derived from gid never collide, so they are not remembered (see `FileNames`)
+    unique_names = False
     def __init__(self, cfg: ExportConfig, gid: str, name: str, parent: Self, raw_data:dict = None):
         self.cfg = cfg
         self.gid = gid
         self.name = name
         self.parent = parent
         self.raw_data = raw_data
+        self._paths = {}
+        self._child_slugs = None
+        # file name is assigned right away, names from previous runs are kept (see `FileNames`)
+        self._filename = self.slug_registry().register(self, self.slug())
+    
+    def slug(self) -> str:
+        name = str(self.name) if self.name is not None else ""
+        slug = slugify(name) if len(name) > 0 else ""
+        return slug if len(slug) > 0 else str(self.gid)
+    
+    def slug_registry(self, group: str = None) -> SlugRegistry:
+        """Registry of names in the directory of this entity, `group` selects another set of names (e.g. downloaded files)"""
+        parent = self.parent
+        if not isinstance(parent, SavableHierEntity):
+            return self.cfg.root_slugs
+        group = group or self.save_dir
+        if parent._child_slugs is None:
+            parent._child_slugs = {}
+        registry = parent._child_slugs.get(group)
+        if registry is None:
+            project = parent.project()
+            registry = SlugRegistry(reserved=parent.reserved_names if group is None else (), file_names=self.cfg.file_names,
+                                    scope=project.gid if project is not None else "", key=f"{parent.gid}/{group or ''}")
+            registry = parent._child_slugs.setdefault(group, registry)
+        return registry
+    
+    def claim_filename(self, name: str):
+        """Uses file name from previous export (e.g. name of a loaded raw file)"""
+        if name is None or name == self._filename:
+            return
+        registry = self.slug_registry()
+        registry.release(self._filename)
+        self._filename = registry.register(self, name)
+        self._paths = {}
+    
+    def project(self):
+        """Project this entity belongs to (None for workspaces)"""
+        obj = self
+        while obj is not None and obj.kind != "project":
+            obj = obj.parent
+        return obj
+    
+    def fetch_list(self, endpoint: str, request, opts: dict, batch_path: str = None, batch_params: dict = None) -> list:
+        """Fetches all pages of `request` (returning one page for given options) or takes the results from a batch API call if enabled
+
+        `endpoint` is the name under which the call is recorded in metrics.
+        """
+        metrics = self.cfg.metrics
+        if self.cfg.batcher is not None and batch_path is not None:
+            data = self.cfg.batcher.get(batch_path, opts, batch_params)
+            if data is not None:
+                metrics.items(endpoint, len(data), batched=True)
+                return data
+        with metrics.track(endpoint, self.project()):
+            data = self.cfg.rate_limiter.paginate(request, opts)
+        metrics.items(endpoint, len(data))
+        return data
     
     def filename(self, extension: str = ""):
-        name = str(self.name)
-        return slugify(name if len(name) > 0 else str(self.gid)) + extension
+        return self._filename + extension
     
     def path(self, base_path=default_base_path) -> Path:
-        obj = self.parent
-        obj_path = []
-        while obj is not None and isinstance(obj, SavableHierEntity):
-            obj_path.append(obj)
-            obj = obj.parent
-        obj_path.reverse()
-        path = base_path
-        if not isinstance(base_path, Path):
-            path = Path(sanitize_filepath(base_path))
-        for o in obj_path:
-            path = path / o.filename()
+        """Directory containing this entity, computed once per base path"""
+        path = self._paths.get(base_path)
+        if path is None:
+            if isinstance(self.parent, SavableHierEntity):
+                path = self.parent.get_save_path(base_path=base_path)
+            elif isinstance(base_path, Path):
+                path = base_path
+            else:
+                path = Path(sanitize_filepath(base_path))
+            if self.save_dir is not None:
+                path = path / self.save_dir
+            self._paths[base_path] = path
         return path
     
     def get_save_path(self, extension="", base_path=default_base_path):
         return self.path(base_path=base_path) / self.filename(extension=extension)
     
+    @profiled("save_raw")
     def save_raw(self):
-        path = self.get_save_path(".json", base_path=self.cfg.raw_base_path)
-        if not path.parent.exists():
-            path.parent.mkdir(parents=True)
-        try:
-            with open(path, mode="w") as f:
-                json.dump(self.raw_data, f, indent=2)
-        except (OSError,FileNotFoundError):
-            logger.warn(f"{self} save_raw: \"{path}\" is not a valid path")
+        if self.cfg.store is not None:
+            parent_gid = self.parent.gid if self.parent is not None else None
+            self.cfg.store.put(self.kind, self.gid, parent_gid, self.raw_data.get("modified_at"), self.raw_data)
+        else:
+            path = self.get_save_path(".json", base_path=self.cfg.raw_base_path)
+            try:
+                self.cfg.output.write_text(path, json.dumps(self.raw_data, indent=2))
+            except (OSError,FileNotFoundError):
+                logger.warn(f"{self} save_raw: \"{path}\" is not a valid path")
+        if self.cfg.release_raw_data:
+            self.raw_data = None
+    
+    def raw_children(self, kind: str, save_dir: str = None) -> list[tuple[str, dict]]:
+        """Returns saved raw data of entities of given kind fetched for this entity
+
+        Each item is (file name, data), the file name is None when it is not known (e.g. SQLite store).
+        """
+        if self.cfg.store is not None:
+            return [(None, data) for data in self.cfg.store.children(self.gid, kind)]
+        path = self.get_save_path(base_path=self.cfg.raw_base_path)
+        if save_dir is not None:
+            path = path / save_dir
+        return self.cfg.raw_input.list_json(path)
     
-    def export_html(self, template):
-        save_path = self.get_save_path(base_path=self.cfg.html_base_path) / "index.html"
-        if not save_path.parent.exists():
-            save_path.parent.mkdir(parents=True)
+    def raw_entities(self, cls: Type['SavableHierEntity']) -> list['SavableHierEntity']:
+        """Children of type `cls` saved by the previous export (without their own children)"""
+        children = []
+        for name, data in self.raw_children(cls.kind, cls.save_dir):
+            child = cls.from_data(data, self.cfg, parent=self)
+            child.claim_filename(name)
+            children.append(child)
+        return children
+    
+    def export_html(self, template, page: ListingPage = None, **context):
+        """Renders page of this entity, `page` is the page of listed children (if any)"""
+        save_path = self.get_save_path(base_path=self.cfg.html_base_path) / (page.filename() if page is not None else "index.html")
         try:
-            with open(save_path, mode="w") as f:
-                f.write(template.render(data=self))
+            written = self.cfg.output.write_text(save_path, template.render(data=self, page=page, **context), if_changed=True)
+            self.cfg.render_stats["written" if written else "unchanged"] += 1
         except (OSError,FileNotFoundError):
             logger.warn(f"{self} save_raw: \"{save_path}\" is not a valid path")
 
+    def delete_files(self, renamed: bool = False):
+        """Removes raw response and exported files of this entity and its children (it was deleted in Asana)
+
+        Entity that was `renamed` is saved again under its new name, only files under the previous name are removed
+        (its raw data in SQLite store is shared with the new name).
+        """
+        if self.cfg.store is not None:
+            if not renamed:
+                parent_gid = self.parent.gid if self.parent is not None else None
+                self.cfg.store.delete(self.kind, self.gid, parent_gid)
+        else:
+            self.get_save_path(".json", base_path=self.cfg.raw_base_path).unlink(missing_ok=True)
+            shutil.rmtree(self.get_save_path(base_path=self.cfg.raw_base_path), ignore_errors=True)
+        shutil.rmtree(self.get_save_path(base_path=self.cfg.html_base_path), ignore_errors=True)
+
+def remove_deleted(old: list[SavableHierEntity], new: list[SavableHierEntity]):
+    """Removes files of entities from `old` whose files are not used by any entity in `new`
+
+    Tasks that are in both lists (as different objects) are compared recursively.
+    """
+    new_by_name = {obj.filename().lower(): obj for obj in new}
+    new_gids = {obj.gid for obj in new}
+    for obj in old:
+        current = new_by_name.get(obj.filename().lower())
+        if current is None:
+            obj.slug_registry().release(obj.filename())
+            obj.delete_files(renamed=obj.gid in new_gids)
+        elif current is not obj and isinstance(obj, Task) and not current.incomplete:
+            remove_deleted(obj.subtasks, current.subtasks)
+            remove_deleted(obj.stories, current.stories)
+            remove_deleted(obj.attachments, current.attachments)
+
 class Attachment(SavableHierEntity):
+    __slots__ = ("download_url", "view_url", "created_at", "size", "resource_subtype", "file_name")
+    kind = "attachment"
     save_dir = "attachments"
-    def __init__(self, cfg: ExportConfig, gid: str, name: str, download_url: str, created_at: str, size: int, resource_subtype: str, parent: 'Task' = None, raw_data: dict = None):
+    # names of downloaded files (next to raw responses of attachments when they are not separated)
+    files_group = "attachments/files"
+    chunk_size = 1024 * 1024
+    def __init__(self, cfg: ExportConfig, gid: str, name: str, download_url: str, created_at: str, size: int, resource_subtype: str, view_url: str = None, parent: 'Task' = None, raw_data: dict = None):
         self.download_url = download_url
+        self.view_url = view_url
         self.created_at = created_at
         self.size = size
         self.resource_subtype = resource_subtype
         super().__init__(cfg, gid, name, parent, raw_data)
+        # attachments of one task can have the same name, gid is inserted before the extension
+        self.file_name = None
+        if name is not None:
+            stem, ext = os.path.splitext(name)
+            self.file_name = self.slug_registry(self.files_group).register(self, name, suffixed=f"{stem}-{gid}{ext}")
     
     def from_data(data: dict, cfg: ExportConfig, parent = None):
-        return Attachment(cfg, data["gid"], data["name"], data["download_url"], data["created_at"], data.get("size"), data["resource_subtype"], parent=parent, raw_data=data)
-    
-    def path(self, base_path=default_base_path) -> Path:
-        return super().path(base_path=base_path) / self.save_dir
+        return Attachment(cfg, data["gid"], data["name"], data["download_url"], data["created_at"], data.get("size"), data["resource_subtype"], data.get("view_url"), parent=parent, raw_data=data)
     
-    def save(self):
+    @profiled("download")
+    def save(self, session: 'requests.Session' = None, progress = None) -> int:
+        """Downloads the attachment, returns number of downloaded bytes"""
         if self.download_url is None:
             if self.resource_subtype == "asana":
                 raise Exception("Download URL of an attachment is not specified")
             logger.warning(f"{self} no download url - skipping download")
-            return
-        if self.name is None:
+            return 0
+        if self.file_name is None:
             raise Exception("Name of an attachment is not specified")
-        save_path = self.path(base_path=self.cfg.html_base_path) / self.name
-        if not save_path.parent.exists():
-            save_path.parent.mkdir(parents=True)
-        resp = requests.get(self.download_url, stream=True)
-        size = int(resp.headers.get('content-length', 0))
-        block_size = 1024
+        if session is None:
+            session = requests.Session()
+        if progress is None:
+            progress = lambda n: None
+        output = self.cfg.output
+        save_path = self.path(base_path=self.cfg.html_base_path) / self.file_name
+        if output.has_file(save_path, self.size):
+            logger.debug(f"{self} already downloaded - skipping")
+            progress(self.size or 0)
+            return 0
+        if self.cfg.attachment_pool is not None:
+            return self.cfg.attachment_pool.save(self, save_path, session, progress)
+        part_path = output.part_path(save_path)
+        downloaded = self.download(part_path, session, progress)
+        output.add_file(save_path, part_path)
+        return downloaded
+
+    def delete_files(self, renamed: bool = False):
+        super().delete_files(renamed)
+        if self.file_name is not None:
+            (self.path(base_path=self.cfg.html_base_path) / self.file_name).unlink(missing_ok=True)
+            self.slug_registry(self.files_group).release(self.file_name)
+
+    def download(self, part_path: Path, session: 'requests.Session', progress) -> int:
+        """Downloads content to `part_path`, returns number of downloaded bytes
+
+        Unfinished download (existing `part_path`) is resumed using Range request.
+        """
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
         size_str = ""
         if self.size is not None:
             size_str = f" ({humanize.naturalsize(self.size, binary=True)})"
-        print(f"Downloading {self.name}{size_str}")
-        with tqdm(total=size, unit="B", unit_scale=True) as progress_bar:
-            with open(save_path, mode="wb") as f:
-                for data in resp.iter_content(block_size):
-                    progress_bar.update(len(data))
+        logger.info(f"Downloading {self.name}{size_str}")
+        with session.get(self.download_url, stream=True, headers=headers, timeout=60) as resp:
+            if resp.status_code == 416 and offset > 0:
+                # nothing left to download
+                progress(offset)
+                return 0
+            resp.raise_for_status()
+            mode = "wb"
+            if offset > 0 and resp.status_code == 206:
+                mode = "ab"
+                progress(offset)
+            downloaded = 0
+            with open(part_path, mode=mode) as f:
+                for data in resp.iter_content(self.chunk_size):
+                    progress(len(data))
                     f.write(data)
+                    downloaded += len(data)
+        return downloaded
 
 # Story is a comment on task or an update message
 class Story(SavableHierEntity):
+    __slots__ = ("story_type", "likes", "text", "created_at", "username")
+    kind = "story"
     save_dir = "stories"
+    unique_names = True
     # TODO: how are represented attachments within comments
     def __init__(self, cfg: ExportConfig, gid: str, story_type: str, likes: list, text: str, created_at: str, username: str = None, parent: Self = None, raw_data: dict = None):
         self.story_type = story_type
@@ -156,12 +664,12 @@ class Story(SavableHierEntity):
             username = data["created_by"]["name"]
         
         return Story(cfg, data["gid"], data["type"], data.get("likes"), data["html_text"], data["created_at"], username=username, parent=parent, raw_data=data)
-    
-    def path(self, base_path=default_base_path) -> (Path, str):
-        return super().path(base_path=base_path) / self.save_dir
 
 class Task(SavableHierEntity):
-    def __init__(self, cfg: ExportConfig, gid: str, name: str, due_at: str, due_on: str, followers: list, notes: str, num_subtasks: int, tags: list, memberships: list, parent: Self | 'Project' = None, raw_data: dict = None):
+    __slots__ = ("due_at", "due_on", "followers", "notes", "num_subtasks", "subtasks", "tags", "stories", "attachments", "memberships", "modified_at", "incomplete", "name_xfrm")
+    kind = "task"
+    reserved_names = (Story.save_dir, Attachment.save_dir)
+    def __init__(self, cfg: ExportConfig, gid: str, name: str, due_at: str, due_on: str, followers: list, notes: str, num_subtasks: int, tags: list, memberships: list, modified_at: str = None, parent: Self | 'Project' = None, raw_data: dict = None):
         self.due_at = due_at
         self.due_on = due_on
         self.followers = followers
@@ -172,6 +680,9 @@ class Task(SavableHierEntity):
         self.stories = []
         self.attachments = []
         self.memberships = memberships
+        self.modified_at = modified_at
+        # set when some of the requests for this task failed
+        self.incomplete = False
         self.name_xfrm = locale.strxfrm(name)
         super().__init__(cfg, gid, name, parent, raw_data)
     
@@ -179,20 +690,106 @@ class Task(SavableHierEntity):
         return f"Task(\n\t{self.gid=},\n\t{self.name=},\n\t{self.due_at=},\n\t{self.due_on=},\n\t{self.followers=},\n\t{self.notes=},\n\t{self.num_subtasks=},\n\t{self.subtasks=},\n\t{self.tags=},\n\t{self.memberships=},\n\t{len(self.stories)=}\n\t)"
     
     def from_data(data: dict, cfg: ExportConfig, parent = None):
-        return Task(cfg, data["gid"], data["name"], data["due_at"], data["due_on"], data["followers"], data["html_notes"], data["num_subtasks"], data["tags"], data["memberships"], parent=parent, raw_data=data)
+        return Task(cfg, data["gid"], data["name"], data["due_at"], data["due_on"], data["followers"], data["html_notes"], data["num_subtasks"], data["tags"], data["memberships"], data.get("modified_at"), parent=parent, raw_data=data)
     
-    def get_all(self):
-        logger.info(f"{self} getting stories")
+    def update(self, data: dict):
+        """Replaces fields by newly fetched `data`, file name is kept so existing links stay valid"""
+        self.name = data["name"]
+        self.due_at = data["due_at"]
+        self.due_on = data["due_on"]
+        self.followers = data["followers"]
+        self.notes = data["html_notes"]
+        self.num_subtasks = data["num_subtasks"]
+        self.tags = data["tags"]
+        self.memberships = data["memberships"]
+        self.modified_at = data.get("modified_at")
+        self.name_xfrm = locale.strxfrm(self.name)
+        self.raw_data = data
+    
+    def refresh(self) -> list[Self]:
+        """Fetches stories, attachments and subtasks of this task again and removes files of deleted ones
+
+        Subtasks that were fetched before keep their children, returns new subtasks (not fetched yet).
+        """
+        old_stories = self.stories
+        old_attachments = self.attachments
+        old_subtasks = self.subtasks
+        # new objects of the same stories and attachments get the same file names
+        for child in old_stories + old_attachments:
+            child.slug_registry().release(child.filename())
+        self.incomplete = False
         self.get_stories()
-        logger.debug(f"{self} {self.stories=}")
-        logger.info(f"{self} getting attachments")
         self.get_attachments()
-        logger.debug(f"{self} {self.attachments=}")
-        logger.info(f"{self} getting subtasks")
-        subtasks = self.get_subtasks()
-        logger.debug(f"{self} {self.subtasks=}")
+        if old_subtasks or self.cfg.planner.need_subtasks(self):
+            self.get_subtasks(known={sub.gid: sub for sub in old_subtasks})
+        if self.incomplete:
+            # keep the previous state, the task is fetched again later
+            self.stories = old_stories
+            self.attachments = old_attachments
+            self.subtasks = old_subtasks
+            return []
+        remove_deleted(old_stories, self.stories)
+        remove_deleted(old_attachments, self.attachments)
+        remove_deleted(old_subtasks, self.subtasks)
+        known = {sub.gid for sub in old_subtasks}
+        return [sub for sub in self.subtasks if sub.gid not in known]
+    
+    @profiled("crawl")
+    def get_all(self):
+        manifest = self.cfg.manifest
+        journal = self.cfg.journal
+        if journal is not None and journal.is_done(self):
+            logger.info(f"{self} fetched by interrupted export - loading from raw")
+            self.load_stories_from_raw()
+            self.load_attachments_from_raw()
+            self.load_subtasks_from_raw(recursive=False)
+            # downloads of the interrupted export may not be finished
+            if self.cfg.download_attachments:
+                for atch in self.attachments:
+                    self.cfg.downloader.submit(atch)
+            if manifest is not None:
+                manifest.record(self)
+            for sub in self.subtasks:
+                self.cfg.scheduler.submit(sub.get_all)
+            return
+        old_stories, old_attachments, old_subtasks = [], [], []
+        if manifest is not None and manifest.is_unchanged(self):
+            logger.info(f"{self} not modified since previous export - loading stories and attachments from raw")
+            self.load_stories_from_raw()
+            self.load_attachments_from_raw()
+            # downloads that failed in the previous export are retried, finished files are skipped
+            if self.cfg.download_attachments:
+                for atch in self.attachments:
+                    self.cfg.downloader.submit(atch)
+        else:
+            if manifest is not None:
+                # children deleted or renamed since the previous export are removed when all of them are fetched
+                old_stories = self.raw_entities(Story)
+                old_attachments = self.raw_entities(Attachment)
+            logger.info(f"{self} getting stories")
+            self.get_stories()
+            logger.debug(f"{self} {self.stories=}")
+            logger.info(f"{self} getting attachments")
+            self.get_attachments()
+            logger.debug(f"{self} {self.attachments=}")
+        # changes of subtasks do not change modified_at of their parent, they have to be checked one by one
+        subtasks = []
+        if self.cfg.planner.need_subtasks(self):
+            if manifest is not None:
+                old_subtasks = self.raw_entities(Task)
+            logger.info(f"{self} getting subtasks")
+            subtasks = self.get_subtasks()
+            logger.debug(f"{self} {self.subtasks=}")
+        if not self.incomplete:
+            remove_deleted(old_stories, self.stories)
+            remove_deleted(old_attachments, self.attachments)
+            remove_deleted(old_subtasks, self.subtasks)
+            if manifest is not None:
+                manifest.record(self)
+            if journal is not None:
+                journal.record(self)
         for sub in subtasks:
-            sub.get_all()
+            self.cfg.scheduler.submit(sub.get_all)
     
     def save_raw_rec(self):
         self.save_raw()
@@ -203,8 +800,29 @@ class Task(SavableHierEntity):
         for atch in self.attachments:
             atch.save_raw_rec()
     
+    @staticmethod
+    def sort_key(tsk: 'Task'):
+        return (tsk.name_xfrm, tsk.gid)
+    
+    @profiled("render")
     def export(self):
-        self.export_html(template=self.cfg.html_templates[self.__class__.__name__])
+        self.export_pages()
+        for tsk in self.subtasks:
+            tsk.export()
+    
+    def pages(self) -> list[tuple[ListingPage, object, dict]]:
+        """Pages of this task - (page of subtasks, template, additional template context)"""
+        pages = paginate(sorted(self.subtasks, key=Task.sort_key), self.cfg.page_size, "subtasks-")
+        # the first page of subtasks is part of the task page, other pages are plain listings
+        return [(pages[0], self.cfg.html_templates[self.__class__.__name__], {})] + \
+            [(page, self.cfg.html_templates["listing"], {"listing_title": "Subtasks"}) for page in pages[1:]]
+    
+    def export_pages(self):
+        """Renders pages of this task without its subtasks"""
+        pages = self.pages()
+        for page, template, context in pages:
+            self.export_html(template=template, page=page, **context)
+        remove_stale_pages(self.cfg.output, self.get_save_path(base_path=self.cfg.html_base_path), "subtasks-", len(pages))
 
     def get_stories(self) -> list[Story]:
         if self.cfg is None or self.cfg.api_client is None:
@@ -214,20 +832,22 @@ class Task(SavableHierEntity):
         opts = {
             'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
             # 'offset': "eyJ0eXAiOJiKV1iQLCJhbGciOiJIUzI1NiJ9", # str | Offset token. An offset to the next page returned by the API. A pagination request will return an offset token, which can be used as an input parameter to the next request. If an offset is not passed in, the API will return the first page of results. *Note: You can only pass in an offset that was returned to you via a previously paginated request.*
-            'opt_fields': "assignee,assignee.name,created_at,created_by,created_by.name,custom_field,custom_field.date_value,custom_field.date_value.date,custom_field.date_value.date_time,custom_field.display_value,custom_field.enabled,custom_field.enum_options,custom_field.enum_options.color,custom_field.enum_options.enabled,custom_field.enum_options.name,custom_field.enum_value,custom_field.enum_value.color,custom_field.enum_value.enabled,custom_field.enum_value.name,custom_field.id_prefix,custom_field.is_formula_field,custom_field.multi_enum_values,custom_field.multi_enum_values.color,custom_field.multi_enum_values.enabled,custom_field.multi_enum_values.name,custom_field.name,custom_field.number_value,custom_field.representation_type,custom_field.resource_subtype,custom_field.text_value,custom_field.type,dependency,dependency.created_by,dependency.name,dependency.resource_subtype,duplicate_of,duplicate_of.created_by,duplicate_of.name,duplicate_of.resource_subtype,duplicated_from,duplicated_from.created_by,duplicated_from.name,duplicated_from.resource_subtype,follower,follower.name,hearted,hearts,hearts.user,hearts.user.name,html_text,is_editable,is_edited,is_pinned,liked,likes,likes.user,likes.user.name,new_approval_status,new_date_value,new_dates,new_dates.due_at,new_dates.due_on,new_dates.start_on,new_enum_value,new_enum_value.color,new_enum_value.enabled,new_enum_value.name,new_multi_enum_values,new_multi_enum_values.color,new_multi_enum_values.enabled,new_multi_enum_values.name,new_name,new_number_value,new_people_value,new_people_value.name,new_resource_subtype,new_section,new_section.name,new_text_value,num_hearts,num_likes,offset,old_approval_status,old_date_value,old_dates,old_dates.due_at,old_dates.due_on,old_dates.start_on,old_enum_value,old_enum_value.color,old_enum_value.enabled,old_enum_value.name,old_multi_enum_values,old_multi_enum_values.color,old_multi_enum_values.enabled,old_multi_enum_values.name,old_name,old_number_value,old_people_value,old_people_value.name,old_resource_subtype,old_section,old_section.name,old_text_value,path,previews,previews.fallback,previews.footer,previews.header,previews.header_link,previews.html_text,previews.text,previews.title,previews.title_link,project,project.name,resource_subtype,source,sticker_name,story,story.created_at,story.created_by,story.created_by.name,story.resource_subtype,story.text,tag,tag.name,target,target.created_by,target.name,target.resource_subtype,task,task.created_by,task.name,task.resource_subtype,text,type,uri", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
+            'opt_fields': self.cfg.opt_fields["story"], # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
         }
         stories = []
         try:
             # Get stories from a task
-            api_response = stories_api_instance.get_stories_for_task(self.gid, opts)
+            api_response = self.fetch_list("get_stories_for_task", lambda opts: stories_api_instance.get_stories_for_task(self.gid, opts, full_payload=True), opts, f"/tasks/{self.gid}/stories")
             for data in api_response:
                 logger.debug(f"{self} story-data={data}")
                 story = Story.from_data(data, self.cfg, parent=self)
                 stories.append(story)
                 if self.cfg.save_raw:
                     story.save_raw()
-        except ApiException as e:
-            print("Exception when calling StoriesApi->get_stories_for_task: %s\n" % e)
+        except asana_rest.ApiException as e:
+            logger.error(f"{self} exception when calling StoriesApi->get_stories_for_task: {e}")
+            self.incomplete = True
+            self.cfg.incomplete = True
         self.stories = stories
         return stories
     
@@ -239,12 +859,12 @@ class Task(SavableHierEntity):
         opts = {
             'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
             # 'offset': "eyJ0eXAiOJiKV1iQLCJhbGciOiJIUzI1NiJ9", # str | Offset token. An offset to the next page returned by the API. A pagination request will return an offset token, which can be used as an input parameter to the next request. If an offset is not passed in, the API will return the first page of results. *Note: You can only pass in an offset that was returned to you via a previously paginated request.*
-            'opt_fields': "connected_to_app,created_at,download_url,host,name,offset,parent,parent.created_by,parent.name,parent.resource_subtype,path,permanent_url,resource_subtype,size,uri,view_url", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
+            'opt_fields': self.cfg.opt_fields["attachment"], # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
         }
         attachments = []
         try:
             # Get attachments from an object
-            api_response = attachments_api_instance.get_attachments_for_object(self.gid, opts)
+            api_response = self.fetch_list("get_attachments_for_object", lambda opts: attachments_api_instance.get_attachments_for_object(self.gid, opts, full_payload=True), opts, "/attachments", {"parent": self.gid})
             for data in api_response:
                 logger.debug(f"{self} attachment-data={data}")
                 atch = Attachment.from_data(data, self.cfg, parent=self)
@@ -252,13 +872,16 @@ class Task(SavableHierEntity):
                 if self.cfg.save_raw:
                     atch.save_raw()
                 if self.cfg.download_attachments:
-                    atch.save()
-        except ApiException as e:
-            print("Exception when calling AttachmentsApi->get_attachments_for_object: %s\n" % e)
+                    self.cfg.downloader.submit(atch)
+        except asana_rest.ApiException as e:
+            logger.error(f"{self} exception when calling AttachmentsApi->get_attachments_for_object: {e}")
+            self.incomplete = True
+            self.cfg.incomplete = True
         self.attachments = attachments
         return self.attachments
     
-    def get_subtasks(self) -> list[Self]:
+    def get_subtasks(self, known: dict[str, Self] = None) -> list[Self]:
+        """Fetches subtasks, `known` are subtasks fetched before (by gid) which are updated instead of created again"""
         if self.cfg is None or self.cfg.api_client is None:
             raise Exception("No asana api client defined")
         # create an instance of the API class
@@ -266,51 +889,64 @@ class Task(SavableHierEntity):
         opts = {
             'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
             # 'offset': "eyJ0eXAiOJiKV1iQLCJhbGciOiJIUzI1NiJ9", # str | Offset token. An offset to the next page returned by the API. A pagination request will return an offset token, which can be used as an input parameter to the next request. If an offset is not passed in, the API will return the first page of results. *Note: You can only pass in an offset that was returned to you via a previously paginated request.*
-            'opt_fields': "actual_time_minutes,approval_status,assignee,assignee.name,assignee_section,assignee_section.name,assignee_status,completed,completed_at,completed_by,completed_by.name,created_at,created_by,custom_fields,custom_fields.asana_created_field,custom_fields.created_by,custom_fields.created_by.name,custom_fields.currency_code,custom_fields.custom_label,custom_fields.custom_label_position,custom_fields.date_value,custom_fields.date_value.date,custom_fields.date_value.date_time,custom_fields.description,custom_fields.display_value,custom_fields.enabled,custom_fields.enum_options,custom_fields.enum_options.color,custom_fields.enum_options.enabled,custom_fields.enum_options.name,custom_fields.enum_value,custom_fields.enum_value.color,custom_fields.enum_value.enabled,custom_fields.enum_value.name,custom_fields.format,custom_fields.has_notifications_enabled,custom_fields.id_prefix,custom_fields.is_formula_field,custom_fields.is_global_to_workspace,custom_fields.is_value_read_only,custom_fields.multi_enum_values,custom_fields.multi_enum_values.color,custom_fields.multi_enum_values.enabled,custom_fields.multi_enum_values.name,custom_fields.name,custom_fields.number_value,custom_fields.people_value,custom_fields.people_value.name,custom_fields.precision,custom_fields.representation_type,custom_fields.resource_subtype,custom_fields.text_value,custom_fields.type,dependencies,dependents,due_at,due_on,external,external.data,followers,followers.name,hearted,hearts,hearts.user,hearts.user.name,html_notes,is_rendered_as_separator,liked,likes,likes.user,likes.user.name,memberships,memberships.project,memberships.project.name,memberships.section,memberships.section.name,modified_at,name,notes,num_hearts,num_likes,num_subtasks,offset,parent,parent.created_by,parent.name,parent.resource_subtype,path,permalink_url,projects,projects.name,resource_subtype,start_at,start_on,tags,tags.name,uri,workspace,workspace.name", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
+            'opt_fields': self.cfg.opt_fields["task"], # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
         }
         subtasks = []
         try:
             # Get tasks from a project
-            api_response = tasks_api_instance.get_subtasks_for_task(self.gid, opts)
+            api_response = self.fetch_list("get_subtasks_for_task", lambda opts: tasks_api_instance.get_subtasks_for_task(self.gid, opts, full_payload=True), opts, f"/tasks/{self.gid}/subtasks")
             for data in api_response:
                 logger.debug(f"{self} subtask-data={data}")
-                tsk = Task.from_data(data, self.cfg, parent=self)
+                tsk = known.get(data["gid"]) if known else None
+                if tsk is None:
+                    tsk = Task.from_data(data, self.cfg, parent=self)
+                else:
+                    tsk.update(data)
                 subtasks.append(tsk)
                 if self.cfg.save_raw:
                     tsk.save_raw()
-        except ApiException as e:
-            print("Exception when calling TasksApi->get_subtasks_for_task: %s\n" % e)
+        except asana_rest.ApiException as e:
+            logger.error(f"{self} exception when calling TasksApi->get_subtasks_for_task: {e}")
+            self.incomplete = True
+            self.cfg.incomplete = True
         self.subtasks = subtasks
         return self.subtasks
     
-    def load_from_raw(self):
-        path, name = self.path(base_path=self.cfg.raw_base_path), self.filename()
-        task_path = path / name
-        subtask_files = task_path.glob("*.json")
-        for subtask_file in subtask_files:
-            with open(subtask_file) as f:
-                data = json.load(f)
-                subtask = Task.from_data(data, self.cfg, parent=self)
-                self.subtasks.append(subtask)
+    def load_subtasks_from_raw(self, recursive: bool = True):
+        for subtask in self.raw_entities(Task):
+            self.subtasks.append(subtask)
+            if recursive:
                 subtask.load_from_raw()
-        stories_path = task_path / Story.save_dir
-        story_files = stories_path.glob("*.json")
-        for story_file in story_files:
-            with open(story_file) as f:
-                data = json.load(f)
-                self.stories.append(Story.from_data(data, self.cfg, parent=self))
-        attachments_path = task_path / Attachment.save_dir
-        atch_files = attachments_path.glob("*.json")
-        for atch_file in atch_files:
-            with open(atch_file) as f:
-                data = json.load(f)
-                self.attachments.append(Attachment.from_data(data, self.cfg, parent=self))
+    
+    def load_stories_from_raw(self):
+        self.stories += self.raw_entities(Story)
+        # keep the same (chronological) order as returned by API
+        self.stories.sort(key=lambda story: story.created_at)
+    
+    def load_attachments_from_raw(self):
+        self.attachments += self.raw_entities(Attachment)
+        self.attachments.sort(key=lambda atch: atch.created_at)
+    
+    def load_from_raw(self):
+        self.load_subtasks_from_raw()
+        self.load_stories_from_raw()
+        self.load_attachments_from_raw()
+    
+    def release(self):
+        for sub in self.subtasks:
+            sub.release()
+        self.subtasks = []
+        self.stories = []
+        self.attachments = []
 
 class Project(SavableHierEntity):
+    __slots__ = ("color", "modified_at", "tasks", "incomplete")
+    kind = "project"
     def __init__(self, cfg: ExportConfig, gid: str, name: str, color: str, modified_at: str, parent: 'Workspace' = None, raw_data: dict = None):
         self.color = color
         self.modified_at = modified_at
         self.tasks = []
+        self.incomplete = False
         super().__init__(cfg, gid, name, parent, raw_data)
     
     def __repr__(self):
@@ -320,23 +956,55 @@ class Project(SavableHierEntity):
     def from_data(data: dict, cfg: ExportConfig, parent = None):
         return Project(cfg, data["gid"], data["name"], data["color"], data["modified_at"], parent=parent, raw_data=data)
     
+    def update(self, data: dict):
+        """Replaces fields by newly fetched `data`, file name is kept so existing links stay valid"""
+        self.name = data["name"]
+        self.color = data["color"]
+        self.modified_at = data["modified_at"]
+        self.raw_data = data
+    
+    @profiled("crawl")
     def get_all(self):
-        logger.info(f"{self} getting tasks")
-        tasks = self.get_tasks()
-        logger.debug(f"{self} {self.tasks=}")
+        journal = self.cfg.journal
+        if journal is not None and journal.is_done(self):
+            logger.info(f"{self} tasks fetched by interrupted export - loading from raw")
+            tasks = self.load_tasks_from_raw()
+        else:
+            # incremental export removes files of tasks deleted or renamed since the previous export
+            old_tasks = self.raw_entities(Task) if self.cfg.manifest is not None else None
+            logger.info(f"{self} getting tasks")
+            tasks = self.get_tasks()
+            logger.debug(f"{self} {self.tasks=}")
+            if old_tasks is not None and not self.incomplete:
+                remove_deleted(old_tasks, self.tasks)
+            if journal is not None and not self.incomplete:
+                journal.record(self)
         for tsk in tasks:
-            tsk.get_all()
+            self.cfg.scheduler.submit(tsk.get_all)
     
     def save_raw_rec(self):
         self.save_raw()
         for tsk in self.tasks:
             tsk.save_raw_rec()
     
+    @profiled("render")
     def export(self):
-        self.export_html(template=self.cfg.html_templates[self.__class__.__name__])
+        self.export_pages()
         for tsk in self.tasks:
             tsk.export()
     
+    def pages(self) -> list[tuple[ListingPage, object, dict]]:
+        """Pages of this project - (page of tasks, template, additional template context)"""
+        template = self.cfg.html_templates[self.__class__.__name__]
+        return [(page, template, {}) for page in paginate(sorted(self.tasks, key=Task.sort_key), self.cfg.page_size, "page-")]
+    
+    def export_pages(self):
+        """Renders pages of this project without its tasks"""
+        pages = self.pages()
+        for page, template, context in pages:
+            self.export_html(template=template, page=page, **context)
+        remove_stale_pages(self.cfg.output, self.get_save_path(base_path=self.cfg.html_base_path), "page-", len(pages))
+    
     def get_tasks(self):
         if self.cfg is None or self.cfg.api_client is None:
             raise Exception("No asana api client defined")
@@ -346,38 +1014,112 @@ class Project(SavableHierEntity):
             # 'completed_since': "2012-02-22T02:06:58.158Z", # str | Only return tasks that are either incomplete or that have been completed since this time. Accepts a date-time string or the keyword *now*. 
             'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
             # 'offset': "eyJ0eXAiOJiKV1iQLCJhbGciOiJIUzI1NiJ9", # str | Offset token. An offset to the next page returned by the API. A pagination request will return an offset token, which can be used as an input parameter to the next request. If an offset is not passed in, the API will return the first page of results. *Note: You can only pass in an offset that was returned to you via a previously paginated request.*
-            'opt_fields': "actual_time_minutes,approval_status,assignee,assignee.name,assignee_section,assignee_section.name,assignee_status,completed,completed_at,completed_by,completed_by.name,created_at,created_by,custom_fields,custom_fields.asana_created_field,custom_fields.created_by,custom_fields.created_by.name,custom_fields.currency_code,custom_fields.custom_label,custom_fields.custom_label_position,custom_fields.date_value,custom_fields.date_value.date,custom_fields.date_value.date_time,custom_fields.description,custom_fields.display_value,custom_fields.enabled,custom_fields.enum_options,custom_fields.enum_options.color,custom_fields.enum_options.enabled,custom_fields.enum_options.name,custom_fields.enum_value,custom_fields.enum_value.color,custom_fields.enum_value.enabled,custom_fields.enum_value.name,custom_fields.format,custom_fields.has_notifications_enabled,custom_fields.id_prefix,custom_fields.is_formula_field,custom_fields.is_global_to_workspace,custom_fields.is_value_read_only,custom_fields.multi_enum_values,custom_fields.multi_enum_values.color,custom_fields.multi_enum_values.enabled,custom_fields.multi_enum_values.name,custom_fields.name,custom_fields.number_value,custom_fields.people_value,custom_fields.people_value.name,custom_fields.precision,custom_fields.representation_type,custom_fields.resource_subtype,custom_fields.text_value,custom_fields.type,dependencies,dependents,due_at,due_on,external,external.data,followers,followers.name,hearted,hearts,hearts.user,hearts.user.name,html_notes,is_rendered_as_separator,liked,likes,likes.user,likes.user.name,memberships,memberships.project,memberships.project.name,memberships.section,memberships.section.name,modified_at,name,notes,num_hearts,num_likes,num_subtasks,offset,parent,parent.created_by,parent.name,parent.resource_subtype,path,permalink_url,projects,projects.name,resource_subtype,start_at,start_on,tags,tags.name,uri,workspace,workspace.name", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
+            'opt_fields': self.cfg.opt_fields["task"], # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
         }
+        if self.cfg.scope.completed_since is not None:
+            opts['completed_since'] = self.cfg.scope.completed_since
         tasks = []
         try:
             # Get tasks from a project
-            api_response = tasks_api_instance.get_tasks_for_project(self.gid, opts)
+            api_response = self.fetch_list("get_tasks_for_project", lambda opts: tasks_api_instance.get_tasks_for_project(self.gid, opts, full_payload=True), opts)
             for data in api_response:
                 logger.debug(f"{self} task-data={data}")
+                if not self.cfg.scope.include_task(self.gid, data):
+                    continue
                 tsk = Task.from_data(data, self.cfg, parent=self)
                 tasks.append(tsk)
                 if self.cfg.save_raw:
                     tsk.save_raw()
-        except ApiException as e:
-            print("Exception when calling TasksApi->get_tasks_for_project: %s\n" % e)
+        except asana_rest.ApiException as e:
+            logger.error(f"{self} exception when calling TasksApi->get_tasks_for_project: {e}")
+            self.incomplete = True
+            self.cfg.incomplete = True
         self.tasks = tasks
         return self.tasks
     
+    def load_tasks_from_raw(self) -> list[Task]:
+        self.tasks += self.raw_entities(Task)
+        return self.tasks
+    
+    @profiled("load")
     def load_from_raw(self):
-        path, name = self.path(base_path=self.cfg.raw_base_path), self.filename()
-        tasks_path = path / name
-        task_files = tasks_path.glob("*.json")
-        for tsk_file in task_files:
-            with open(tsk_file) as f:
-                data = json.load(f)
-                task = Task.from_data(data, self.cfg, parent=self)
-                self.tasks.append(task)
-                task.load_from_raw()
+        for task in self.load_tasks_from_raw():
+            task.load_from_raw()
+    
+    def refresh(self):
+        """Fetches all tasks of this project again and removes files of tasks that no longer exist"""
+        old_tasks = self.tasks
+        self.tasks = []
+        # tasks get their file names again, known tasks keep their names (see `FileNames`)
+        self._child_slugs = None
+        self.incomplete = False
+        self.get_all()
+        self.cfg.scheduler.join()
+        if not self.incomplete:
+            remove_deleted(old_tasks, self.tasks)
+    
+    def release(self):
+        """Drops all tasks of this project (and their file names) so they can be garbage collected"""
+        for tsk in self.tasks:
+            tsk.release()
+        self.tasks = []
+        self._child_slugs = None
+        if self.cfg.file_names is not None:
+            self.cfg.file_names.evict(self.gid)
+        self.cfg.metrics.release_project(self)
+    
+    def delete_files(self, renamed: bool = False):
+        super().delete_files(renamed)
+        if self.cfg.file_names is not None and not renamed:
+            self.cfg.file_names.drop(self.gid)
+
+    def snapshot_records(self):
+        index = 0
+        def task_records(tsk: Task, parent_index: int):
+            nonlocal index
+            task_index = index
+            index += 1
+            yield {"kind": "task", "parent": parent_index, "data": tsk.raw_data}
+            for story in tsk.stories:
+                index += 1
+                yield {"kind": "story", "parent": task_index, "data": story.raw_data}
+            for atch in tsk.attachments:
+                index += 1
+                yield {"kind": "attachment", "parent": task_index, "data": atch.raw_data}
+            for sub in tsk.subtasks:
+                yield from task_records(sub, task_index)
+        for tsk in self.tasks:
+            yield from task_records(tsk, -1)
+    
+    def save_snapshot(self, path: Path):
+        snapshot.write_records(path / snapshot.project_file(self.gid), self.snapshot_records())
+    
+    @profiled("load")
+    def load_from_snapshot(self, path: Path):
+        entities = []
+        for record in snapshot.read_records(path / snapshot.project_file(self.gid)):
+            parent = self if record["parent"] < 0 else entities[record["parent"]]
+            kind, data = record["kind"], record["data"]
+            if kind == "task":
+                obj = Task.from_data(data, self.cfg, parent=parent)
+                (self.tasks if parent is self else parent.subtasks).append(obj)
+            elif kind == "story":
+                obj = Story.from_data(data, self.cfg, parent=parent)
+                parent.stories.append(obj)
+            elif kind == "attachment":
+                obj = Attachment.from_data(data, self.cfg, parent=parent)
+                parent.attachments.append(obj)
+            else:
+                raise Exception(f"Unknown record kind in snapshot: {kind}")
+            entities.append(obj)
 
 class Workspace(SavableHierEntity):
+    __slots__ = ("projects", "incomplete")
+    kind = "workspace"
     def __init__(self, cfg: ExportConfig, gid: str, name: str, raw_data: dict = None):
         self.raw_data = raw_data
         self.projects = []
+        self.incomplete = False
         super().__init__(cfg, gid, name, None, raw_data)
     
     @staticmethod
@@ -385,11 +1127,19 @@ class Workspace(SavableHierEntity):
         return Workspace(cfg, data['gid'], data['name'], raw_data=data)
     
     def get_all(self):
-        logger.info(f"{self} getting projects")
-        projects = self.get_projects()
-        logger.debug(f"{self} {self.projects=}")
+        journal = self.cfg.journal
+        if journal is not None and journal.is_done(self):
+            logger.info(f"{self} projects fetched by interrupted export - loading from raw")
+            self.load_from_raw(project_gids=[])
+            projects = self.projects
+        else:
+            logger.info(f"{self} getting projects")
+            projects = self.get_projects()
+            logger.debug(f"{self} {self.projects=}")
+            if journal is not None and not self.incomplete:
+                journal.record(self)
         for prj in projects:
-            prj.get_all()
+            self.cfg.scheduler.submit(prj.get_all)
     
     def save_raw_rec(self):
         self.save_raw()
@@ -401,7 +1151,8 @@ class Workspace(SavableHierEntity):
         for prj in self.projects:
             prj.export()
     
-    def get_projects(self) -> list[Project]:
+    def get_projects(self, known: dict[str, Project] = None) -> list[Project]:
+        """Fetches projects, `known` are projects fetched before (by gid) which are updated instead of created again"""
         if self.cfg is None or self.cfg.api_client is None:
             raise Exception("No asana api client defined")
         # create an instance of the API class
@@ -410,35 +1161,49 @@ class Workspace(SavableHierEntity):
             'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
             # 'offset': "eyJ0eXAiOJiKV1iQLCJhbGciOiJIUzI1NiJ9", # str | Offset token. An offset to the next page returned by the API. A pagination request will return an offset token, which can be used as an input parameter to the next request. If an offset is not passed in, the API will return the first page of results. *Note: You can only pass in an offset that was returned to you via a previously paginated request.*
             # 'archived': False, # bool | Only return projects whose `archived` field takes on the value of this parameter.
-            'opt_fields': "archived,color,completed,completed_at,completed_by,completed_by.name,created_at,created_from_template,created_from_template.name,current_status,current_status.author,current_status.author.name,current_status.color,current_status.created_at,current_status.created_by,current_status.created_by.name,current_status.html_text,current_status.modified_at,current_status.text,current_status.title,current_status_update,current_status_update.resource_subtype,current_status_update.title,custom_field_settings,custom_field_settings.custom_field,custom_field_settings.custom_field.asana_created_field,custom_field_settings.custom_field.created_by,custom_field_settings.custom_field.created_by.name,custom_field_settings.custom_field.currency_code,custom_field_settings.custom_field.custom_label,custom_field_settings.custom_field.custom_label_position,custom_field_settings.custom_field.date_value,custom_field_settings.custom_field.date_value.date,custom_field_settings.custom_field.date_value.date_time,custom_field_settings.custom_field.description,custom_field_settings.custom_field.display_value,custom_field_settings.custom_field.enabled,custom_field_settings.custom_field.enum_options,custom_field_settings.custom_field.enum_options.color,custom_field_settings.custom_field.enum_options.enabled,custom_field_settings.custom_field.enum_options.name,custom_field_settings.custom_field.enum_value,custom_field_settings.custom_field.enum_value.color,custom_field_settings.custom_field.enum_value.enabled,custom_field_settings.custom_field.enum_value.name,custom_field_settings.custom_field.format,custom_field_settings.custom_field.has_notifications_enabled,custom_field_settings.custom_field.id_prefix,custom_field_settings.custom_field.is_formula_field,custom_field_settings.custom_field.is_global_to_workspace,custom_field_settings.custom_field.is_value_read_only,custom_field_settings.custom_field.multi_enum_values,custom_field_settings.custom_field.multi_enum_values.color,custom_field_settings.custom_field.multi_enum_values.enabled,custom_field_settings.custom_field.multi_enum_values.name,custom_field_settings.custom_field.name,custom_field_settings.custom_field.number_value,custom_field_settings.custom_field.people_value,custom_field_settings.custom_field.people_value.name,custom_field_settings.custom_field.precision,custom_field_settings.custom_field.representation_type,custom_field_settings.custom_field.resource_subtype,custom_field_settings.custom_field.text_value,custom_field_settings.custom_field.type,custom_field_settings.is_important,custom_field_settings.parent,custom_field_settings.parent.name,custom_field_settings.project,custom_field_settings.project.name,custom_fields,custom_fields.date_value,custom_fields.date_value.date,custom_fields.date_value.date_time,custom_fields.display_value,custom_fields.enabled,custom_fields.enum_options,custom_fields.enum_options.color,custom_fields.enum_options.enabled,custom_fields.enum_options.name,custom_fields.enum_value,custom_fields.enum_value.color,custom_fields.enum_value.enabled,custom_fields.enum_value.name,custom_fields.id_prefix,custom_fields.is_formula_field,custom_fields.multi_enum_values,custom_fields.multi_enum_values.color,custom_fields.multi_enum_values.enabled,custom_fields.multi_enum_values.name,custom_fields.name,custom_fields.number_value,custom_fields.representation_type,custom_fields.resource_subtype,custom_fields.text_value,custom_fields.type,default_access_level,default_view,due_date,due_on,followers,followers.name,html_notes,icon,members,members.name,minimum_access_level_for_customization,minimum_access_level_for_sharing,modified_at,name,notes,offset,owner,path,permalink_url,privacy_setting,project_brief,public,start_on,team,team.name,uri,workspace,workspace.name", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
+            'opt_fields': self.cfg.opt_fields["project"], # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
         }
+        if self.cfg.scope.skip_archived:
+            opts['archived'] = False
         projects = []
         try:
             # Get all projects in a workspace
-            api_response = projects_api_instance.get_projects_for_workspace(self.gid, opts)
+            api_response = self.fetch_list("get_projects_for_workspace", lambda opts: projects_api_instance.get_projects_for_workspace(self.gid, opts, full_payload=True), opts)
             for data in api_response:
                 logger.debug(f"{self} project-data={data}")
-                prj = Project.from_data(data, self.cfg, parent=self)
+                if not self.cfg.scope.include_project(data):
+                    continue
+                prj = known.get(data["gid"]) if known else None
+                if prj is None:
+                    prj = Project.from_data(data, self.cfg, parent=self)
+                else:
+                    prj.update(data)
+                # projects of other shards are created too, so every shard assigns the same file names
+                if not self.cfg.in_shard(prj.gid):
+                    continue
                 projects.append(prj)
                 if self.cfg.save_raw:
                     prj.save_raw()
-        except ApiException as e:
-            print("Exception when calling ProjectsApi->get_projects_for_workspace: %s\n" % e)
+        except asana_rest.ApiException as e:
+            logger.error(f"{self} exception when calling ProjectsApi->get_projects_for_workspace: {e}")
+            self.incomplete = True
+            self.cfg.incomplete = True
         self.projects = projects
         return self.projects
     
     def __repr__(self):
         return f"Workspace({self.gid=}, {self.name=})"
     
-    def load_from_raw(self):
-        path, name = self.path(base_path=self.cfg.raw_base_path), self.filename()
-        projects_path = path / name
-        project_files = projects_path.glob("*.json")
-        for prj_file in project_files:
-            with open(prj_file) as f:
-                data = json.load(f)
-                project = Project.from_data(data, self.cfg, parent=self)
-                self.projects.append(project)
+    def load_from_raw(self, project_gids: list[str] = None):
+        for name, data in self.raw_children(Project.kind):
+            if not self.cfg.scope.include_project(data):
+                continue
+            project = Project.from_data(data, self.cfg, parent=self)
+            project.claim_filename(name)
+            if not self.cfg.in_shard(project.gid):
+                continue
+            self.projects.append(project)
+            if project_gids is None or project.gid in project_gids:
                 project.load_from_raw()
     
     @staticmethod
@@ -449,20 +1214,22 @@ class Workspace(SavableHierEntity):
         opts = {
             'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
             # 'offset': "eyJ0eXAiOJiKV1iQLCJhbGciOiJIUzI1NiJ9", # str | Offset token. An offset to the next page returned by the API. A pagination request will return an offset token, which can be used as an input parameter to the next request. If an offset is not passed in, the API will return the first page of results. *Note: You can only pass in an offset that was returned to you via a previously paginated request.*
-            'opt_fields': "email_domains,is_organization,name,offset,path,uri", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
+            'opt_fields': cfg.opt_fields["workspace"], # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
         }
         workspaces = []
         try:
             # Get multiple workspaces
-            api_response = workspaces_api_instance.get_workspaces(opts)
+            with cfg.metrics.track("get_workspaces"):
+                api_response = cfg.rate_limiter.paginate(lambda opts: workspaces_api_instance.get_workspaces(opts, full_payload=True), opts)
+            cfg.metrics.items("get_workspaces", len(api_response))
             for data in api_response:
                 logger.debug(f"workspace-data={data}")
                 workspace = Workspace.from_data(data, cfg)
                 if cfg.save_raw:
                     workspace.save_raw()
                 workspaces.append(workspace)
-        except ApiException as e:
-            print("Exception when calling WorkspacesApi->get_workspaces: %s\n" % e)
+        except asana_rest.ApiException as e:
+            logger.error(f"exception when calling WorkspacesApi->get_workspaces: {e}")
         return workspaces
 class AsanaExporter:
     api_client = None
@@ -470,21 +1237,65 @@ class AsanaExporter:
         self.workspaces = []
         self.cfg = cfg
     def getAll(self):
+        self.cfg.open_journal()
         self.workspaces = Workspace.get_workspaces(self.cfg)
         for ws in self.workspaces:
-            if self.cfg.save_raw:
-                ws.save_raw()
-            ws.get_all()
-    def exportAll(self):
-        self.export_html(self.cfg.html_templates["index"], path=self.cfg.html_base_path)
-        for ws in self.workspaces:
-            ws.export()
+            self.cfg.scheduler.submit(ws.get_all)
+        self.cfg.scheduler.join()
+        self.cfg.planner.report()
+        self.cfg.scope.report()
+        if self.cfg.manifest is not None:
+            self.cfg.manifest.save()
+        if self.cfg.file_names is not None:
+            self.cfg.file_names.save()
+        self.cfg.close_journal()
+    def exportAll(self, project_gids: list[str] = None):
+        # overview and workspace pages of a sharded export are rendered by merge_shards
+        sharded = self.cfg.shard is not None
+        if not sharded:
+            self.export_html(self.cfg.html_templates["index"], path=self.cfg.html_base_path)
+        jobs = []
+        for ws_index, ws in enumerate(self.workspaces):
+            if not sharded:
+                ws.export_html(template=self.cfg.html_templates[ws.__class__.__name__])
+            jobs += [(ws_index, prj_index) for prj_index, prj in enumerate(ws.projects) if project_gids is None or prj.gid in project_gids]
+        # worker processes are forked so they share already loaded workspaces instead of pickling them
+        if self.cfg.render_processes > 1 and len(jobs) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            global _render_exporter
+            _render_exporter = self
+            with ProcessPoolExecutor(max_workers=self.cfg.render_processes, mp_context=multiprocessing.get_context("fork")) as pool:
+                for stats in pool.map(_export_project, jobs):
+                    for key, value in stats.items():
+                        self.cfg.render_stats[key] += value
+            _render_exporter = None
+        else:
+            for ws_index, prj_index in jobs:
+                self.workspaces[ws_index].projects[prj_index].export()
+        if self.cfg.search_index:
+            if project_gids is None:
+                self.export_search()
+            else:
+                logger.info("search index is not updated when exporting only some projects")
+        logger.info(f"exported {self.cfg.render_stats['written']} HTML files, {self.cfg.render_stats['unchanged']} unchanged")
+    def export_search(self, builder: SearchIndexBuilder = None):
+        """Writes search index of all tasks (unless already collected in `builder`) and the search page"""
+        if builder is None:
+            builder = SearchIndexBuilder(self.cfg.html_base_path)
+            for ws in self.workspaces:
+                for prj in ws.projects:
+                    builder.add_project(prj)
+        if self.cfg.shard is not None:
+            # combined with indexes of other shards by merge_shards
+            shards.write_json(shards.state_path(self.cfg.output_dir, *self.cfg.shard, suffix=".search.json"), builder.to_dict())
+            return
+        output = self.cfg.output
+        count = builder.write(output)
+        output.write_text(self.cfg.html_base_path / "search.html", self.cfg.html_templates["search"].render(search_dir=SEARCH_DIR), if_changed=True)
+        logger.info(f"search index contains {count} tasks")
     def export_html(self, template, path = default_base_path):
-        if not path.exists():
-            path.mkdir(parents=True)
-        with open(path / "index.html", mode="w") as f:
-            f.write(template.render(data=self))
-    def load_from_raw(self):
+        written = self.cfg.output.write_text(path / "index.html", template.render(data=self), if_changed=True)
+        self.cfg.render_stats["written" if written else "unchanged"] += 1
+    def load_from_raw(self, project_gids: list[str] = None):
         # Raw files are stored alongside the folder which they represent
         # Folder structure:
         # - Workspace/
@@ -493,14 +1304,147 @@ class AsanaExporter:
         #           - (/Subtask/...)
         #           - stories/
         #           - attachments/
-        ws_files = self.cfg.raw_base_path.glob("*.json")
-        for ws_file in ws_files:
-            with open(ws_file) as f:
-                data = json.load(f)
-                ws = Workspace.from_data(data, self.cfg)
+        # (or in SQLite database if configured)
+        if self.cfg.store is not None:
+            ws_data = [(None, data) for data in self.cfg.store.children(None, Workspace.kind)]
+        else:
+            ws_data = [(name, data) for name, data in self.cfg.raw_input.list_json(self.cfg.raw_base_path) if name + ".json" not in (METRICS_FILE, SYNC_TOKENS_FILE)]
+        for name, data in ws_data:
+            ws = Workspace.from_data(data, self.cfg)
+            ws.claim_filename(name)
+            self.workspaces.append(ws)
+            ws.load_from_raw(project_gids)
+    def snapshot_path(self) -> Path:
+        return self.cfg.raw_base_path / snapshot.SNAPSHOT_DIR
+    def has_snapshot(self) -> bool:
+        return (self.snapshot_path() / snapshot.INDEX_FILE).exists()
+    def save_snapshot(self):
+        path = self.snapshot_path()
+        for ws in self.workspaces:
+            for prj in ws.projects:
+                prj.save_snapshot(path)
+        self.save_snapshot_index()
+    def save_snapshot_index(self):
+        # index is written last so an interrupted run does not leave incomplete snapshot behind
+        # (for sharded export it is written by merge_shards when all shards are finished)
+        if self.cfg.shard is not None:
+            return
+        index = []
+        for ws in self.workspaces:
+            index.append({"kind": "workspace", "data": ws.raw_data})
+            for prj in ws.projects:
+                index.append({"kind": "project", "parent": ws.gid, "data": prj.raw_data})
+        snapshot.write_records(self.snapshot_path() / snapshot.INDEX_FILE, index)
+    def load_from_snapshot(self, project_gids: list[str] = None):
+        path = self.snapshot_path()
+        workspaces = {}
+        for record in snapshot.read_records(path / snapshot.INDEX_FILE):
+            if record["kind"] == "workspace":
+                ws = Workspace.from_data(record["data"], self.cfg)
+                workspaces[ws.gid] = ws
                 self.workspaces.append(ws)
-                ws.load_from_raw()
+            elif record["kind"] == "project":
+                ws = workspaces[record["parent"]]
+                prj = Project.from_data(record["data"], self.cfg, parent=ws)
+                ws.projects.append(prj)
+                if project_gids is None or prj.gid in project_gids:
+                    prj.load_from_snapshot(path)
+    def finish_shard(self):
+        """Marks the shard exported by this process as finished, see shards.py"""
+        projects = [prj.gid for ws in self.workspaces for prj in ws.projects]
+        shards.write_state(self.cfg.output_dir, *self.cfg.shard, projects, self.cfg.metrics.error_count())
+        logger.info(f"shard {shards.shard_name(*self.cfg.shard)} finished ({len(projects)} projects) - run with --merge-shards when all shards are finished")
+    def merge_shards(self, use_snapshot: bool = False):
+        """Renders overview and workspace pages and the search index of an export made by shards"""
+        states = shards.read_states(self.cfg.output_dir)
+        if not states:
+            logger.error(f"no finished shards in {self.cfg.output_dir / shards.SHARDS_DIR}")
+            return
+        count = states[0]["count"]
+        # projects of all shards are listed from their raw responses, their tasks are not needed
+        self.load_from_raw(project_gids=[])
+        if use_snapshot and len(states) == count:
+            self.save_snapshot_index()
+        if self.cfg.export_html:
+            self.export_html(self.cfg.html_templates["index"], path=self.cfg.html_base_path)
+            for ws in self.workspaces:
+                ws.export_html(template=self.cfg.html_templates[ws.__class__.__name__])
+        if self.cfg.search_index:
+            builder = SearchIndexBuilder(self.cfg.html_base_path)
+            for state in states:
+                path = shards.state_path(self.cfg.output_dir, state["shard"], count, suffix=".search.json")
+                if path.exists():
+                    with open(path) as f:
+                        builder.extend(json.load(f))
+            self.export_search(builder)
+        logger.info(f"merged {len(states)} of {count} shards, {sum(len(state['projects']) for state in states)} projects")
+    def streamAll(self, load_local: bool = False, use_snapshot: bool = False, project_gids: list[str] = None):
+        """Fetches (or loads), saves and exports one project at a time and releases it afterwards
 
+        Peak memory is given by the largest project instead of the whole workspace.
+        """
+        from_snapshot = load_local and use_snapshot and self.has_snapshot()
+        if from_snapshot:
+            self.load_from_snapshot(project_gids=[])
+        elif load_local:
+            self.load_from_raw(project_gids=[])
+        else:
+            self.cfg.open_journal()
+            self.workspaces = Workspace.get_workspaces(self.cfg)
+            for ws in self.workspaces:
+                ws.get_projects()
+        # overview and workspace pages of a sharded export are rendered by merge_shards
+        render_overview = self.cfg.export_html and self.cfg.shard is None
+        if render_overview:
+            self.export_html(self.cfg.html_templates["index"], path=self.cfg.html_base_path)
+        # the index is not complete when only some projects are exported
+        search = None
+        if self.cfg.search_index and not (load_local and project_gids is not None):
+            search = SearchIndexBuilder(self.cfg.html_base_path)
+        for ws in self.workspaces:
+            if render_overview:
+                ws.export_html(template=self.cfg.html_templates[ws.__class__.__name__])
+            for prj in ws.projects:
+                if load_local and project_gids is not None and prj.gid not in project_gids:
+                    continue
+                if from_snapshot:
+                    prj.load_from_snapshot(self.snapshot_path())
+                elif load_local:
+                    prj.load_from_raw()
+                else:
+                    prj.get_all()
+                    self.cfg.scheduler.join()
+                if use_snapshot and not from_snapshot:
+                    prj.save_snapshot(self.snapshot_path())
+                if self.cfg.export_html:
+                    prj.export()
+                if search is not None:
+                    search.add_project(prj)
+                prj.release()
+        if use_snapshot and not from_snapshot:
+            self.save_snapshot_index()
+        if search is not None:
+            self.export_search(search)
+        if not load_local:
+            self.cfg.planner.report()
+            self.cfg.scope.report()
+            if self.cfg.manifest is not None:
+                self.cfg.manifest.save()
+            if self.cfg.file_names is not None:
+                self.cfg.file_names.save()
+            self.cfg.close_journal()
+        if self.cfg.export_html:
+            logger.info(f"exported {self.cfg.render_stats['written']} HTML files, {self.cfg.render_stats['unchanged']} unchanged")
+
+# exporter whose projects are rendered by forked worker processes
+_render_exporter = None
+
+def _export_project(job: tuple[int, int]) -> dict:
+    ws_index, prj_index = job
+    cfg = _render_exporter.cfg
+    cfg.render_stats = {"written": 0, "unchanged": 0}
+    _render_exporter.workspaces[ws_index].projects[prj_index].export()
+    return cfg.render_stats
 
 def navigation_relpaths(base_obj: SavableHierEntity):
     navigation = []
@@ -520,38 +1464,115 @@ def remove_bodytag(value):
     value = re.sub(r'</body>\s*$', '', value)
     return value
 
-def main(args):
-    default_base_path = Path(args.output_dir)
-    
-    load_dotenv()
-
+def create_api_client(max_connections: int):
     configuration = asana.Configuration()
     configuration.access_token = os.getenv("ASANA_TOKEN")
+    configuration.host = os.getenv("ASANA_HOST", configuration.host)
+    configuration.connection_pool_maxsize = max(configuration.connection_pool_maxsize, max_connections)
     api_client = asana.ApiClient(configuration)
+    # 429 responses are handled by RateLimiter for all workers at once, urllib3 would
+    # otherwise silently sleep on Retry-After in each thread separately
+    api_client.rest_client.pool_manager.connection_pool_kw["retries"] = urllib3.Retry(3, respect_retry_after_header=False)
+    return api_client
 
+def create_templates(template_dir: str = "templates", cache_dir: Path|str = None) -> dict:
+    """Loads HTML templates, compiled templates are cached in `cache_dir` (default `<template_dir>/__pycache__`)"""
+    cache_dir = Path(cache_dir) if cache_dir is not None else Path(template_dir) / "__pycache__"
+    bytecode_cache = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        if os.access(cache_dir, os.W_OK):
+            bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+    except OSError:
+        # e.g. read-only installation - templates are compiled on every run
+        pass
     env = Environment(
-        loader=FileSystemLoader("templates"),
-        autoescape=select_autoescape()
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape(),
+        bytecode_cache=bytecode_cache,
     )
 
     env.filters["remove_bodytag"] = remove_bodytag
     env.filters["navigation_relpaths"] = navigation_relpaths
 
-    templates = {
+    return {
         "index": env.get_template("index.html"),
         Workspace.__name__: env.get_template("workspace.html"),
         Project.__name__: env.get_template("project.html"),
         Task.__name__: env.get_template("task.html"),
+        "search": env.get_template("search.html"),
+        "listing": env.get_template("listing.html"),
     }
 
+def main(args):
+    default_base_path = Path(args.output_dir)
+
+    if args.load_archive:
+        args.load_local_responses = True
+    if args.sync and (args.archive or args.load_archive):
+        parser.error("--sync cannot be used with archives")
+    shard = None
+    if args.shard:
+        try:
+            shard = shards.parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        # shards run concurrently, they can share only plain files in the output directory
+        if args.sqlite or args.archive or args.load_archive or args.sync or args.merge_shards:
+            parser.error("--shard cannot be used with --sqlite, archives, --sync or --merge-shards")
+
+    profiler = None
+    if args.profile or args.profile_project:
+        profiler = Profiler(default_base_path, project_gid=args.profile_project)
+        # profiles of worker processes would be lost
+        args.render_processes = 1
+
+    # regenerating HTML from raw responses does not use Asana API, so the SDK is not even imported
+    offline = args.merge_shards or (args.load_local_responses and not args.sync)
+    api_client = None
+    if not offline:
+        dotenv.load_dotenv()
+        api_client = create_api_client(args.jobs)
+    templates = create_templates()
+
     cfg = ExportConfig(
         api_client=api_client,
         output_dir=args.output_dir,
-        save_raw=args.save_raw_responses,
-        separate_raw=args.separate_responses,
-        export_html=args.export_html,
-        download_attachments=args.download_attachments,
-        html_templates=templates
+        html_templates=templates,
+        network=NetworkOptions(
+            concurrency=args.jobs,
+            download_concurrency=args.download_jobs,
+            batch_requests=args.batch_requests,
+            fields_profile=args.fields,
+        ),
+        state=StateOptions(
+            incremental=args.incremental,
+            resume=args.resume,
+            sqlite_path=args.sqlite,
+            shard=shard,
+        ),
+        output=OutputOptions(
+            save_raw=args.save_raw_responses,
+            separate_raw=args.separate_responses,
+            export_html=args.export_html,
+            download_attachments=args.download_attachments and not offline,
+            render_processes=args.render_processes,
+            release_raw_data=args.streaming and not args.snapshot,
+            dedupe_attachments=args.dedupe_attachments,
+            search_index=not args.no_search_index,
+            page_size=args.page_size,
+            archive_path=args.archive,
+            input_archive_path=args.load_archive,
+        ),
+        scope=ExportScope(
+            include_projects=args.include_project,
+            exclude_projects=args.exclude_project,
+            skip_archived=args.skip_archived,
+            completed_since=args.completed_since,
+            include_sections=args.include_section,
+            exclude_sections=args.exclude_section,
+        ),
+        profiler=profiler,
     )
 
     logging.basicConfig(filename=args.log_file, level=logging.DEBUG)
@@ -565,15 +1586,72 @@ def main(args):
     if args.locale:
         locale.setlocale(locale.LC_ALL, args.locale)
 
+    if args.snapshot and (args.archive or args.load_archive):
+        logger.warning("snapshot is not supported with archives - ignoring")
+        args.snapshot = False
+
+    # memory usage of each step is recorded with --profile
+    stage = profiler.stage if profiler is not None else lambda name: nullcontext()
+
     exporter = AsanaExporter(cfg)
-    if args.load_local_responses:
-        exporter.load_from_raw()
+    if args.merge_shards:
+        with stage("merge"):
+            exporter.merge_shards(use_snapshot=args.snapshot)
+    elif args.sync:
+        # sync.py builds on this module, so it is imported only when needed
+        from sync import SyncDaemon
+        with stage("sync"):
+            try:
+                SyncDaemon(exporter, interval=args.sync_interval).run()
+            except KeyboardInterrupt:
+                logger.info("sync: stopped")
+    elif args.streaming:
+        with stage("streaming"):
+            exporter.streamAll(load_local=args.load_local_responses, use_snapshot=args.snapshot, project_gids=args.only_project)
+    elif args.load_local_responses:
+        with stage("load"):
+            if args.snapshot and exporter.has_snapshot():
+                exporter.load_from_snapshot()
+            else:
+                exporter.load_from_raw(args.only_project)
+                if args.snapshot:
+                    # convert existing raw responses to snapshot
+                    exporter.save_snapshot()
     else:
-        exporter.getAll()
+        with stage("crawl"):
+            exporter.getAll()
+            if args.snapshot:
+                exporter.save_snapshot()
     
-    if cfg.export_html:
-        exporter.exportAll()
+    cfg.shutdown()
+    
+    if cfg.export_html and not args.streaming and not args.sync and not args.merge_shards:
+        with stage("render"):
+            exporter.exportAll(args.only_project if args.load_local_responses else None)
+    
+    metrics_path = cfg.metrics_path()
+    report = cfg.metrics.save_json(metrics_path, extra={"render": cfg.render_stats})
+    totals = report["totals"]
+    if api_client is not None:
+        logger.info(f"API: {totals['calls']} calls, {totals['pages']} HTTP requests, {humanize.naturalsize(totals['bytes'], binary=True)}, {totals['errors']} errors, {totals['rate_limited']} rate limited - details in {metrics_path}")
+    if report["downloads"]["failed"] > 0:
+        logger.warning(f"{report['downloads']['failed']} attachment downloads failed - run the export again to download them")
+    if args.metrics_prom:
+        cfg.metrics.save_prometheus(Path(args.metrics_prom))
+    if cfg.shard is not None:
+        exporter.finish_shard()
+    if profiler is not None:
+        profiler.save()
+    
+    cfg.close()
 
 if __name__ == "__main__":
-    args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    # the script runs as module `exporter`, so sync.py and viewer.py importing it share its classes
+    import exporter
+    if sys.argv[1:2] == ["serve"]:
+        # local web server rendering pages of an existing export (see viewer.py)
+        import viewer
+        viewer.main(viewer.parser.parse_args(sys.argv[2:]))
+    else:
+        args = exporter.parser.parse_args()
+        exporter.main(args)
\ No newline at end of file
@@ -0,0 +1,28 @@
+import importlib
+
+# Modules imported on first use
+#
+# Network-only dependencies (Asana SDK, requests, ...) take a large part of startup time,
+# runs that only regenerate HTML from raw responses never use them.
+
+class LazyModule:
+    """Stands in for module `name`, which is imported when any of its attributes is accessed"""
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if attr in ("_name", "_module"):
+            # not initialized yet (e.g. copied object)
+            raise AttributeError(attr)
+        module = self._module
+        if module is None:
+            # import system is thread-safe, concurrent first uses get the same module
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"LazyModule({self._name!r}, loaded={self._module is not None})"
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
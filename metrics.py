@@ -0,0 +1,255 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Counters of API requests and attachment downloads collected during one run
+#
+# Calls are grouped by endpoint (name of the API method, e.g. "get_stories_for_task").
+# One call can consist of several HTTP requests (pages and retries), these are counted
+# by the instrumented REST client and attributed to the call running on the same thread.
+
+METRICS_FILE = "metrics.json"
+# upper bounds (seconds) of latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# number of released projects (see `Metrics.release_project`) whose stats are kept
+TOP_PROJECTS = 50
+
+class EndpointStats:
+    __slots__ = ("calls", "pages", "items", "bytes", "errors", "handled", "fallbacks", "retries", "rate_limited", "batched", "seconds", "page_seconds", "latency")
+    def __init__(self):
+        self.calls = 0
+        self.pages = 0
+        self.items = 0
+        self.bytes = 0
+        self.errors = 0
+        # failed calls whose status was expected by the caller (e.g. expired sync token)
+        self.handled = 0
+        # failed calls replaced by other requests (e.g. batch request by individual requests)
+        self.fallbacks = 0
+        self.retries = 0
+        self.rate_limited = 0
+        # calls served by a batch API request
+        self.batched = 0
+        self.seconds = 0.0
+        self.page_seconds = 0.0
+        # number of HTTP requests per latency bucket
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe_latency(self, seconds: float):
+        self.page_seconds += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency[i] += 1
+                return
+        self.latency[-1] += 1
+
+    def to_dict(self) -> dict:
+        data = {key: getattr(self, key) for key in self.__slots__ if key != "latency"}
+        data["seconds"] = round(self.seconds, 3)
+        data["page_seconds"] = round(self.page_seconds, 3)
+        data["latency"] = {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), self.latency)}
+        return data
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.monotonic()
+        self.endpoints = {}
+        # gid -> requests made for the project and its tasks
+        self.projects = {}
+        # released projects that are still in `projects`
+        self._released = set()
+        self.downloads = {"files": 0, "skipped": 0, "failed": 0, "bytes": 0, "seconds": 0.0}
+
+    def _endpoint(self, endpoint: str) -> EndpointStats:
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def _project(self, project) -> dict | None:
+        if project is None:
+            return None
+        stats = self.projects.get(project.gid)
+        if stats is None:
+            stats = self.projects[project.gid] = {"name": project.name, "calls": 0, "pages": 0, "bytes": 0, "seconds": 0.0}
+        return stats
+
+    def release_project(self, project):
+        """Project is finished, its stats are kept only if it is among the `TOP_PROJECTS` slowest released ones"""
+        with self._lock:
+            if project.gid not in self.projects:
+                return
+            self._released.add(project.gid)
+            if len(self._released) > TOP_PROJECTS:
+                fastest = min(self._released, key=lambda gid: self.projects[gid]["seconds"])
+                self._released.discard(fastest)
+                del self.projects[fastest]
+
+    @contextmanager
+    def track(self, endpoint: str, project=None, tolerate: tuple = (), fallback: bool = False):
+        """Measures one API call (including all its pages and retries) made on this thread
+
+        Failures with HTTP status in `tolerate` are counted as handled, failures of a call
+        with `fallback` as fallbacks, neither of them is an error.
+        """
+        self._local.endpoint = endpoint
+        self._local.project = project
+        start = time.perf_counter()
+        failed = None
+        try:
+            yield
+        except Exception as e:
+            if fallback:
+                failed = "fallbacks"
+            elif getattr(e, "status", None) in tolerate:
+                failed = "handled"
+            else:
+                failed = "errors"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.endpoint = None
+            self._local.project = None
+            with self._lock:
+                stats = self._endpoint(endpoint)
+                stats.calls += 1
+                stats.seconds += elapsed
+                if failed is not None:
+                    setattr(stats, failed, getattr(stats, failed) + 1)
+                prj_stats = self._project(project)
+                if prj_stats is not None:
+                    prj_stats["calls"] += 1
+                    prj_stats["seconds"] += elapsed
+
+    def items(self, endpoint: str, count: int, batched: bool = False):
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats.items += count
+            if batched:
+                stats.calls += 1
+                stats.batched += 1
+
+    def retry(self):
+        """Counts retry of the call running on this thread"""
+        with self._lock:
+            self._endpoint(getattr(self._local, "endpoint", None) or "other").retries += 1
+
+    def page(self, seconds: float, size: int, status: int | None):
+        endpoint = getattr(self._local, "endpoint", None) or "other"
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats.pages += 1
+            stats.bytes += size
+            stats.observe_latency(seconds)
+            if status == 429:
+                stats.rate_limited += 1
+            prj_stats = self._project(getattr(self._local, "project", None))
+            if prj_stats is not None:
+                prj_stats["pages"] += 1
+                prj_stats["bytes"] += size
+
+    def instrument(self, rest_client):
+        """Wraps `request` of asana REST client so every HTTP request is counted"""
+        # imported only when the API is used, see lazy.py
+        from asana.rest import ApiException
+        request = rest_client.request
+        def instrumented_request(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = request(*args, **kwargs)
+            except ApiException as e:
+                self.page(time.perf_counter() - start, len(e.body or b""), e.status)
+                raise
+            except Exception:
+                self.page(time.perf_counter() - start, 0, None)
+                raise
+            data = getattr(response, "data", None)
+            self.page(time.perf_counter() - start, len(data) if data else 0, getattr(response, "status", None))
+            return response
+        rest_client.request = instrumented_request
+
+    def download(self, size: int, seconds: float, failed: bool = False):
+        with self._lock:
+            if failed:
+                self.downloads["failed"] += 1
+            elif size == 0:
+                self.downloads["skipped"] += 1
+            else:
+                self.downloads["files"] += 1
+            self.downloads["bytes"] += size
+            self.downloads["seconds"] += seconds
+
+    def error_count(self) -> int:
+        """Number of failed API calls and attachment downloads"""
+        with self._lock:
+            return sum(stats.errors for stats in self.endpoints.values()) + self.downloads["failed"]
+
+    def report(self) -> dict:
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in sorted(self.endpoints.items())}
+            projects = sorted(({"gid": gid, **stats, "seconds": round(stats["seconds"], 3)} for gid, stats in self.projects.items()),
+                              key=lambda stats: stats["seconds"], reverse=True)
+            downloads = dict(self.downloads)
+        downloads["seconds"] = round(downloads["seconds"], 3)
+        # throughput of a single download stream
+        downloads["bytes_per_sec"] = round(downloads["bytes"] / downloads["seconds"]) if downloads["seconds"] > 0 else None
+        return {
+            "duration": round(time.monotonic() - self.started, 3),
+            "totals": {key: sum(stats[key] for stats in endpoints.values()) for key in ("calls", "pages", "bytes", "errors", "handled", "fallbacks", "retries", "rate_limited")},
+            "endpoints": endpoints,
+            "downloads": downloads,
+            "projects": projects,
+        }
+
+    def save_json(self, path: Path, extra: dict = None):
+        report = self.report()
+        if extra:
+            report.update(extra)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, mode="w") as f:
+            json.dump(report, f, indent=2)
+        tmp_path.replace(path)
+        return report
+
+    def save_prometheus(self, path: Path):
+        """Writes metrics in Prometheus text format (e.g. for node_exporter textfile collector)"""
+        lines = []
+        def metric(name: str, kind: str, help: str, samples: list):
+            lines.append(f"# HELP asana_exporter_{name} {help}")
+            lines.append(f"# TYPE asana_exporter_{name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"asana_exporter_{name}{{{label_str}}} {value}" if label_str else f"asana_exporter_{name} {value}")
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for name, help in (("calls", "API calls"), ("pages", "HTTP requests"), ("bytes", "response bytes"),
+                               ("errors", "failed API calls"), ("handled", "failed API calls handled by the exporter"),
+                               ("fallbacks", "failed API calls replaced by other requests"), ("retries", "retried API calls"),
+                               ("rate_limited", "responses with status 429"), ("batched", "API calls served by batch requests")):
+                metric(f"api_{name}_total", "counter", help, [({"endpoint": endpoint}, getattr(stats, name)) for endpoint, stats in endpoints])
+            lines.append("# HELP asana_exporter_api_request_duration_seconds latency of HTTP requests")
+            lines.append("# TYPE asana_exporter_api_request_duration_seconds histogram")
+            for endpoint, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.latency):
+                    cumulative += count
+                    lines.append(f'asana_exporter_api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'asana_exporter_api_request_duration_seconds_sum{{endpoint="{endpoint}"}} {round(stats.page_seconds, 3)}')
+                lines.append(f'asana_exporter_api_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+            metric("api_call_seconds_total", "counter", "time spent in API calls including pagination and retries",
+                   [({"endpoint": endpoint}, round(stats.seconds, 3)) for endpoint, stats in endpoints])
+            metric("download_files_total", "counter", "downloaded attachments", [({}, self.downloads["files"])])
+            metric("download_failed_total", "counter", "failed attachment downloads", [({}, self.downloads["failed"])])
+            metric("download_bytes_total", "counter", "downloaded bytes", [({}, self.downloads["bytes"])])
+            metric("download_seconds_total", "counter", "time spent downloading", [({}, round(self.downloads["seconds"], 3))])
+            metric("run_duration_seconds", "gauge", "duration of the export", [({}, round(time.monotonic() - self.started, 3))])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, mode="w") as f:
+            f.write("\n".join(lines) + "\n")
+        tmp_path.replace(path)
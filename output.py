@@ -0,0 +1,257 @@
+import hashlib
+import io
+import json
+import logging
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Destinations of exported files (raw responses, HTML files and attachments)
+#
+# By default files are written to the output directory. With an archive (.zip or .tar.zst)
+# every file becomes an entry named by its path relative to the output directory,
+# so the archive has the same layout as the output directory would have.
+# Raw responses can be read back from either of them.
+
+logger = logging.getLogger(__name__)
+
+class FilesystemOutput:
+    archive = False
+    def __init__(self, root: Path):
+        self.root = root
+
+    def write_text(self, path: Path, content: str, if_changed: bool = False) -> bool:
+        """Writes `content` to `path`, with `if_changed` the file is not rewritten when its content is the same
+
+        Returns True if the file was written.
+        """
+        data = content.encode("utf-8")
+        # a file of different size cannot have the same content, it is not even read
+        if if_changed and path.exists() and path.stat().st_size == len(data):
+            with open(path, mode="rb") as f:
+                if f.read() == data:
+                    return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, mode="wb") as f:
+            f.write(data)
+        return True
+
+    def has_file(self, path: Path, size: int | None) -> bool:
+        return path.exists() and (size is None or path.stat().st_size == size)
+
+    def part_path(self, path: Path) -> Path:
+        """Where unfinished download of `path` is stored"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path.with_name(path.name + ".part")
+
+    def add_file(self, path: Path, source: Path):
+        """Moves finished file `source` to `path`"""
+        source.replace(path)
+
+    def list_files(self, path: Path, pattern: str) -> list[Path]:
+        """Files in directory `path` matching glob `pattern` (e.g. left from a previous export)"""
+        return list(path.glob(pattern))
+
+    def remove(self, path: Path):
+        path.unlink(missing_ok=True)
+
+    def close(self):
+        pass
+
+class ArchiveOutput:
+    """Base of archive outputs, entries can be added from several threads
+
+    The archive is written to a temporary file and renamed when it is closed,
+    so an interrupted export does not leave a truncated archive behind.
+    """
+    archive = True
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = root
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self._lock = threading.Lock()
+        self._names = set()
+        # downloads are finished here before they are added to the archive
+        self._tmp_dir = Path(tempfile.mkdtemp(prefix=".parts-", dir=path.parent))
+
+    def name(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def _claim(self, name: str) -> bool:
+        if name in self._names:
+            logger.warning(f"{self.path}: \"{name}\" is already in the archive - skipping")
+            return False
+        self._names.add(name)
+        return True
+
+    def write_text(self, path: Path, content: str, if_changed: bool = False) -> bool:
+        name = self.name(path)
+        data = content.encode("utf-8")
+        with self._lock:
+            if not self._claim(name):
+                return False
+            self._add_bytes(name, data)
+        return True
+
+    def has_file(self, path: Path, size: int | None) -> bool:
+        return False
+
+    def part_path(self, path: Path) -> Path:
+        return self._tmp_dir / (hashlib.sha1(self.name(path).encode("utf-8")).hexdigest() + ".part")
+
+    def add_file(self, path: Path, source: Path):
+        name = self.name(path)
+        with self._lock:
+            if self._claim(name):
+                self._add_file(name, source)
+        source.unlink()
+
+    def list_files(self, path: Path, pattern: str) -> list[Path]:
+        # archive is always written from scratch, there are no files of a previous export
+        return []
+
+    def remove(self, path: Path):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._close()
+        for part in self._tmp_dir.iterdir():
+            part.unlink()
+        self._tmp_dir.rmdir()
+        self.tmp_path.replace(self.path)
+        logger.info(f"written {len(self._names)} files to {self.path}")
+
+class ZipOutput(ArchiveOutput):
+    def __init__(self, path: Path, root: Path):
+        super().__init__(path, root)
+        self._zip = zipfile.ZipFile(self.tmp_path, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+
+    def _add_bytes(self, name: str, data: bytes):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self._zip.writestr(info, data)
+
+    def _add_file(self, name: str, source: Path):
+        self._zip.write(source, arcname=name)
+
+    def _close(self):
+        self._zip.close()
+
+class TarZstOutput(ArchiveOutput):
+    def __init__(self, path: Path, root: Path):
+        if zstandard is None:
+            raise Exception("writing .tar.zst archives requires zstandard package (pip install zstandard)")
+        super().__init__(path, root)
+        self._file = open(self.tmp_path, mode="wb")
+        self._zstd = zstandard.ZstdCompressor(level=10, threads=-1).stream_writer(self._file)
+        self._tar = tarfile.open(fileobj=self._zstd, mode="w|")
+
+    def _add_bytes(self, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = time.time()
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def _add_file(self, name: str, source: Path):
+        self._tar.add(source, arcname=name)
+
+    def _close(self):
+        self._tar.close()
+        self._zstd.close()
+
+def open_output(archive_path: Path | str | None, root: Path):
+    if archive_path is None:
+        return FilesystemOutput(root)
+    archive_path = Path(archive_path)
+    if archive_path.name.endswith(".zip"):
+        return ZipOutput(archive_path, root)
+    if archive_path.name.endswith(".tar.zst"):
+        return TarZstOutput(archive_path, root)
+    raise Exception(f"unsupported archive type: {archive_path} (use .zip or .tar.zst)")
+
+class FilesystemInput:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def list_json(self, path: Path) -> list[tuple[str, dict]]:
+        """Returns (file name without extension, data) of all json files in directory `path` sorted by name"""
+        children = []
+        for child_file in sorted(path.glob("*.json")):
+            with open(child_file) as f:
+                children.append((child_file.stem, json.load(f)))
+        return children
+
+    def close(self):
+        pass
+
+class ArchiveInput:
+    """Raw responses stored in an archive written by ArchiveOutput"""
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = root
+        # directory (relative to root) -> [(file name without extension, entry)]
+        self._dirs = {}
+
+    def _add(self, name: str, entry):
+        if not name.endswith(".json"):
+            return
+        directory, _, filename = name.rpartition("/")
+        self._dirs.setdefault(directory, []).append((filename[:-len(".json")], entry))
+
+    def list_json(self, path: Path) -> list[tuple[str, dict]]:
+        directory = path.relative_to(self.root).as_posix()
+        if directory == ".":
+            directory = ""
+        return [(stem, json.loads(self._read(entry))) for stem, entry in sorted(self._dirs.get(directory, []), key=lambda item: item[0])]
+
+class ZipInput(ArchiveInput):
+    def __init__(self, path: Path, root: Path):
+        super().__init__(path, root)
+        self._zip = zipfile.ZipFile(path)
+        for name in self._zip.namelist():
+            self._add(name, name)
+
+    def _read(self, entry: str) -> bytes:
+        return self._zip.read(entry)
+
+    def close(self):
+        self._zip.close()
+
+class TarZstInput(ArchiveInput):
+    """tar.zst cannot be read randomly, json entries are read into memory at once"""
+    def __init__(self, path: Path, root: Path):
+        if zstandard is None:
+            raise Exception("reading .tar.zst archives requires zstandard package (pip install zstandard)")
+        super().__init__(path, root)
+        with open(path, mode="rb") as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                with tarfile.open(fileobj=reader, mode="r|") as tar:
+                    for member in tar:
+                        if member.isfile() and member.name.endswith(".json"):
+                            self._add(member.name, tar.extractfile(member).read())
+
+    def _read(self, entry: bytes) -> bytes:
+        return entry
+
+    def close(self):
+        pass
+
+def open_input(archive_path: Path | str | None, root: Path):
+    if archive_path is None:
+        return FilesystemInput(root)
+    archive_path = Path(archive_path)
+    if archive_path.name.endswith(".zip"):
+        return ZipInput(archive_path, root)
+    if archive_path.name.endswith(".tar.zst"):
+        return TarZstInput(archive_path, root)
+    raise Exception(f"unsupported archive type: {archive_path} (use .zip or .tar.zst)")
@@ -0,0 +1,180 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+# CPU and memory profile of one run (`--profile`)
+#
+# Phases (crawl, save_raw, load, render, download) are methods of entities wrapped by `profiled`.
+# Every thread has its own cProfile profiler for each phase, a phase entered inside another phase
+# (e.g. saving raw response of a fetched task) pauses the outer one, so the time is not counted twice.
+# Stages are the steps of `main` (fetching, loading, rendering) - for each of them tracemalloc
+# records peak memory and the lines that allocated most of the memory kept after the stage.
+# With `project_gid` only phases done for that project are profiled (stages cover the whole run).
+
+PROFILE_DIR = "profile"
+SUMMARY_FILE = "summary.json"
+
+logger = logging.getLogger(__name__)
+
+class Profiler:
+    def __init__(self, output_dir: Path, project_gid: str = None, top: int = 40):
+        self.path = Path(output_dir) / PROFILE_DIR
+        self.project_gid = project_gid
+        self.top = top
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # phase -> profilers of all threads
+        self._profiles = {}
+        # phase -> [calls, wall time]
+        self._phases = {}
+        # stage -> memory and duration
+        self.stages = {}
+        # phases that could not be profiled because another profiler was active
+        self.skipped = 0
+        self._ignored = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        tracemalloc.start()
+
+    def _thread_profile(self, phase: str) -> cProfile.Profile:
+        profiles = getattr(self._local, "profiles", None)
+        if profiles is None:
+            profiles = self._local.profiles = {}
+            self._local.stack = []
+        prof = profiles.get(phase)
+        if prof is None:
+            prof = profiles[phase] = cProfile.Profile()
+            with self._lock:
+                self._profiles.setdefault(phase, []).append(prof)
+        return prof
+
+    @contextmanager
+    def phase(self, name: str, project_gid: str = None):
+        """Profiles code running inside the block on the current thread as part of phase `name`"""
+        if self.project_gid is not None and project_gid != self.project_gid:
+            yield
+            return
+        prof = self._thread_profile(name)
+        stack = self._local.stack
+        # re-entered phase (e.g. subtask fetched by the same thread) is already measured
+        outermost = prof not in stack
+        if stack:
+            stack[-1].disable()
+        try:
+            prof.enable()
+        except ValueError:
+            # Python 3.12+ allows only one active profiler
+            with self._lock:
+                self.skipped += 1
+            if stack:
+                stack[-1].enable()
+            yield
+            return
+        stack.append(prof)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            prof.disable()
+            stack.pop()
+            if stack:
+                stack[-1].enable()
+            if outermost:
+                with self._lock:
+                    stats = self._phases.setdefault(name, [0, 0.0])
+                    stats[0] += 1
+                    stats[1] += time.perf_counter() - start
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._ignored)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Records duration, peak memory and top allocators of a step of the run"""
+        tracemalloc.reset_peak()
+        before = self.snapshot()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            after = self.snapshot()
+            self.stages[name] = {"seconds": round(seconds, 3), "peak_bytes": peak, "current_bytes": current}
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.path / f"memory-{name}.txt", mode="w") as f:
+                f.write(f"stage {name}: {seconds:.1f} s, peak {peak} B, kept {current} B\n\n")
+                f.write(f"top {self.top} lines by memory kept after the stage:\n")
+                for stat in after.statistics("lineno")[:self.top]:
+                    f.write(f"{stat}\n")
+                f.write(f"\ntop {self.top} lines by memory allocated during the stage:\n")
+                for stat in after.compare_to(before, "lineno")[:self.top]:
+                    f.write(f"{stat}\n")
+
+    def save(self) -> dict:
+        """Writes profiles of all phases (`<phase>.prof` for pstats/snakeviz and `<phase>.txt`) and summary"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        phases = {}
+        with self._lock:
+            profiles = {phase: list(profs) for phase, profs in self._profiles.items()}
+        for phase, profs in profiles.items():
+            stats = None
+            for prof in profs:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(prof)
+                    else:
+                        stats.add(prof)
+                except TypeError:
+                    # profiler without any data
+                    continue
+            if stats is None:
+                continue
+            stats.dump_stats(self.path / f"{phase}.prof")
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+            (self.path / f"{phase}.txt").write_text(text.getvalue())
+            calls, seconds = self._phases.get(phase, (0, 0.0))
+            phases[phase] = {"calls": calls, "seconds": round(seconds, 3), "profiled_seconds": round(stats.total_tt, 3)}
+        summary = {
+            "project": self.project_gid,
+            "phases": phases,
+            "stages": self.stages,
+            "peak_bytes": max((stage["peak_bytes"] for stage in self.stages.values()), default=0),
+            "skipped_phases": self.skipped,
+        }
+        with open(self.path / SUMMARY_FILE, mode="w") as f:
+            json.dump(summary, f, indent=2)
+        for phase, stats in sorted(phases.items(), key=lambda item: -item[1]["profiled_seconds"]):
+            logger.info(f"profile: {phase} - {stats['calls']} calls, {stats['seconds']} s (summed over threads), {stats['profiled_seconds']} s profiled")
+        if self.skipped:
+            logger.warning(f"profile: {self.skipped} phases were not profiled because another profiler was active (use -j 1)")
+        logger.info(f"profile: peak traced memory {summary['peak_bytes']} B - details in {self.path}")
+        tracemalloc.stop()
+        return summary
+
+def profiled(phase: str):
+    """Profiles the decorated entity method as part of `phase` when profiling is enabled"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.cfg.profiler
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            project = self.project()
+            with profiler.phase(phase, project.gid if project is not None else None):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,139 @@
+import html
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+# Inverted index of exported tasks for client-side search (templates/search.html)
+# Folder structure:
+# - search/
+#   - meta.js - list of shards and number of documents
+#   - shards/<key>.js - {token: [document ids]} for all tokens starting with the same two characters,
+#                       <key> is hex of UTF-8 encoded first two characters of the token
+#   - docs/<n>.js - documents (title, url, location) with ids from n * DOCS_PER_CHUNK
+#
+# The browser loads only shards of the searched words and chunks of found documents.
+# Files are scripts calling `asanaSearch.loaded(name, data)` instead of plain JSON,
+# because browsers do not allow fetching files when the export is opened from disk (file://).
+
+SEARCH_DIR = "search"
+SHARD_PREFIX = 2
+DOCS_PER_CHUNK = 500
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 40
+
+_tag_re = re.compile(r"<[^>]*>")
+_token_re = re.compile(r"\w+")
+
+def normalize(text: str) -> str:
+    """Lower case text without diacritics (the same normalization is done by the search page)"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def tokenize(text: str) -> set[str]:
+    text = normalize(html.unescape(_tag_re.sub(" ", text)))
+    return {token for token in _token_re.findall(text) if MIN_TOKEN_LENGTH <= len(token) <= MAX_TOKEN_LENGTH}
+
+def shard_key(token: str) -> str:
+    return token[:SHARD_PREFIX].encode("utf-8").hex()
+
+def sorted_tasks(tasks: list) -> list:
+    """Tasks in the order of their listings (`Task.sort_key`), so document ids do not depend on the order the tasks were fetched in"""
+    return sorted(tasks, key=lambda tsk: tsk.sort_key(tsk))
+
+class SearchIndexBuilder:
+    """Collects documents (tasks) and writes sharded index to `<html_base_path>/search/`"""
+    def __init__(self, html_base_path: Path):
+        self.html_base_path = html_base_path
+        self.docs = []
+        # token -> ids of documents containing it (in increasing order)
+        self.postings = {}
+        # [gid, location, first document id, end document id] of every added project
+        self.projects = []
+
+    def add(self, title: str, url: str, location: str, texts: list[str]):
+        doc_id = len(self.docs)
+        self.docs.append({"t": title, "u": url, "l": location})
+        tokens = set()
+        for text in texts:
+            if text:
+                tokens |= tokenize(text)
+        for token in tokens:
+            self.postings.setdefault(token, []).append(doc_id)
+
+    def add_task(self, task, location: str):
+        url = task.get_save_path(base_path=self.html_base_path).relative_to(self.html_base_path).as_posix() + "/index.html"
+        texts = [task.name, task.notes]
+        texts += [story.text for story in task.stories if story.story_type == "comment"]
+        self.add(task.name, url, location, texts)
+        for sub in sorted_tasks(task.subtasks):
+            self.add_task(sub, f"{location} > {task.name}")
+
+    def add_project(self, project):
+        location = f"{project.parent.name} > {project.name}" if project.parent is not None else project.name
+        start = len(self.docs)
+        for task in sorted_tasks(project.tasks):
+            self.add_task(task, location)
+        self.projects.append([project.gid, location, start, len(self.docs)])
+
+    def to_dict(self) -> dict:
+        return {"docs": self.docs, "postings": self.postings, "projects": self.projects}
+
+    def extend(self, data: dict):
+        """Adds documents collected by another builder (see `to_dict`), e.g. by another shard"""
+        offset = len(self.docs)
+        self.docs += data["docs"]
+        for gid, location, start, end in data.get("projects", []):
+            self.projects.append([gid, location, start + offset, end + offset])
+        for token, doc_ids in data["postings"].items():
+            self.postings.setdefault(token, []).extend(doc_id + offset for doc_id in doc_ids)
+
+    def ordered(self) -> tuple[list, dict]:
+        """Documents and postings with projects ordered by location (and gid)
+
+        Projects are added in the order they were fetched or loaded (or by shards), the written index
+        does not depend on it. Documents are kept in their order if some of them are not part of a project.
+        """
+        order = sorted(self.projects, key=lambda prj: (prj[1], prj[0]))
+        if order == self.projects or sum(end - start for _, _, start, end in order) != len(self.docs):
+            return self.docs, self.postings
+        new_ids = [0] * len(self.docs)
+        docs = []
+        for _, _, start, end in order:
+            for doc_id in range(start, end):
+                new_ids[doc_id] = len(docs)
+                docs.append(self.docs[doc_id])
+        postings = {token: sorted(new_ids[doc_id] for doc_id in doc_ids) for token, doc_ids in self.postings.items()}
+        return docs, postings
+
+    def write(self, output) -> int:
+        """Writes the index into `output` (see output.py), removes stale files
+
+        Returns number of indexed documents.
+        """
+        path = self.html_base_path / SEARCH_DIR
+        docs, postings = self.ordered()
+        written = set()
+        def write_script(name: str, data):
+            file_path = path / f"{name}.js"
+            output.write_text(file_path, f"asanaSearch.loaded({json.dumps(name)},{json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)});\n", if_changed=True)
+            written.add(file_path)
+        # keys are sorted when written, so the files do not change when the tokens are collected in another order
+        shards = {}
+        for token, doc_ids in postings.items():
+            shards.setdefault(shard_key(token), {})[token] = doc_ids
+        for key, shard in shards.items():
+            write_script(f"shards/{key}", shard)
+        for start in range(0, len(docs), DOCS_PER_CHUNK):
+            write_script(f"docs/{start // DOCS_PER_CHUNK}", docs[start:start + DOCS_PER_CHUNK])
+        write_script("meta", {
+            "docs": len(docs),
+            "docs_per_chunk": DOCS_PER_CHUNK,
+            "shard_prefix": SHARD_PREFIX,
+            "min_token_length": MIN_TOKEN_LENGTH,
+            "shards": sorted(shards.keys()),
+        })
+        for file_path in output.list_files(path, "**/*.js"):
+            if file_path not in written:
+                output.remove(file_path)
+        return len(docs)
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+
+# Splitting one export into independent shards (processes or hosts) writing into the same output directory
+#
+# Projects are assigned to shards by hash of their gid, so every shard fetches, saves and renders
+# a stable subset of projects. When a shard finishes it writes `_shards/<i>-of-<N>.json`
+# (and its part of the search index). The merge step (`--merge-shards`) renders the overview
+# and workspace pages from raw responses of all shards and combines their search indexes.
+
+SHARDS_DIR = "_shards"
+
+logger = logging.getLogger(__name__)
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses "i/N" (1 <= i <= N)"""
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"invalid shard \"{value}\" (expected i/N, e.g. 1/4)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"invalid shard \"{value}\" (i must be between 1 and N)")
+    return index, count
+
+def shard_of(gid: str, count: int) -> int:
+    """Shard (1..count) the entity with `gid` belongs to, the same on every host and Python version"""
+    digest = hashlib.sha1(gid.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+def shard_name(index: int, count: int) -> str:
+    return f"{index}-of-{count}"
+
+def state_path(output_dir: Path, index: int, count: int, suffix: str = ".json") -> Path:
+    return output_dir / SHARDS_DIR / (shard_name(index, count) + suffix)
+
+def write_json(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, mode="w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    tmp_path.replace(path)
+
+def write_state(output_dir: Path, index: int, count: int, projects: list[str], errors: int):
+    """Marks the shard as finished"""
+    write_json(state_path(output_dir, index, count), {
+        "shard": index,
+        "count": count,
+        "projects": projects,
+        "errors": errors,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
+
+def read_states(output_dir: Path) -> list[dict]:
+    """Returns states of finished shards of the latest sharded export (sorted by shard)
+
+    Missing shards are reported, states of exports with a different number of shards are ignored.
+    """
+    states = []
+    for path in sorted((output_dir / SHARDS_DIR).glob("*-of-*.json")):
+        if path.name.count(".") != 1:
+            # search index or metrics of a shard
+            continue
+        with open(path) as f:
+            states.append(json.load(f))
+    if not states:
+        return []
+    # the most recently finished export decides the number of shards
+    count = max(states, key=lambda state: state["finished_at"])["count"]
+    stale = [state for state in states if state["count"] != count]
+    if stale:
+        logger.warning(f"ignoring {len(stale)} shard(s) of an export with different number of shards")
+    states = sorted((state for state in states if state["count"] == count), key=lambda state: state["shard"])
+    missing = sorted(set(range(1, count + 1)) - {state["shard"] for state in states})
+    if missing:
+        logger.warning(f"shards {', '.join(map(str, missing))} of {count} did not finish - their projects are missing")
+    for state in states:
+        if state["errors"] > 0:
+            logger.warning(f"shard {shard_name(state['shard'], count)} finished with {state['errors']} failed requests")
+    return states
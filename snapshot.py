@@ -0,0 +1,44 @@
+import gzip
+import json
+from pathlib import Path
+
+# Packed snapshot of raw API responses
+# Folder structure:
+# - snapshot/
+#   - index.jsonl - workspace and project records
+#   - <project gid>.jsonl.gz - tasks, subtasks, stories and attachments of a project
+#
+# Every line is one record: {"kind": ..., "parent": ..., "data": <raw API response>}
+# Records of a project are stored in pre-order (parent is always before its children),
+# "parent" is the line number of the parent record or -1 for the project itself.
+
+SNAPSHOT_DIR = "snapshot"
+INDEX_FILE = "index.jsonl"
+
+def project_file(gid: str) -> str:
+    return f"{gid}.jsonl.gz"
+
+def _open(path: Path, mode: str, compressed: bool):
+    if compressed:
+        return gzip.open(path, mode=mode, encoding="utf-8", compresslevel=6)
+    return open(path, mode=mode, encoding="utf-8")
+
+def write_records(path: Path, records) -> int:
+    """Writes records (iterable of dicts) to `path`, the file is replaced only after all records are written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    count = 0
+    with _open(tmp_path, "wt", path.suffix == ".gz") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    tmp_path.replace(path)
+    return count
+
+def read_records(path: Path):
+    """Yields records from `path` one by one"""
+    with _open(path, "rt", path.suffix == ".gz") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
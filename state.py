@@ -0,0 +1,197 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from store import SqliteStore
+
+if TYPE_CHECKING:
+    from exporter import SavableHierEntity
+
+# State of the exporter kept in the output directory between runs
+# - .export-manifest - `modified_at` of fetched tasks (--incremental)
+# - .export-journal - entities fetched by an interrupted run (--resume)
+# - .export-names/ - file names assigned to entities
+# - sync_tokens.json - sync tokens of projects (--sync)
+
+SYNC_TOKENS_FILE = "sync_tokens.json"
+
+logger = logging.getLogger(__name__)
+
+class Manifest:
+    """Remembers `modified_at` of every fully fetched task from the previous run
+
+    Entries are keyed by parent and task gid, because a task that is part of several projects
+    is saved separately under each of them.
+    """
+    filename = ".export-manifest"
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.previous = {}
+        self.current = {}
+        if path.exists():
+            with open(path) as f:
+                self.previous = json.load(f)
+    
+    @staticmethod
+    def key(entity: 'SavableHierEntity'):
+        parent_gid = entity.parent.gid if entity.parent is not None else ""
+        return f"{parent_gid}/{entity.gid}"
+    
+    def is_unchanged(self, entity: 'SavableHierEntity') -> bool:
+        modified_at = entity.modified_at
+        return modified_at is not None and self.previous.get(self.key(entity)) == modified_at
+    
+    def record(self, entity: 'SavableHierEntity'):
+        with self._lock:
+            self.current[self.key(entity)] = entity.modified_at
+    
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with self._lock:
+            with open(tmp_path, mode="w") as f:
+                json.dump(self.current, f)
+        tmp_path.replace(self.path)
+
+class Journal:
+    """Append-only record of entities whose children were fully fetched and saved
+
+    An entity is recorded only after raw data of all its children is saved, so a crawl
+    interrupted at any point can be resumed (`--resume`) by loading recorded entities
+    from raw data and fetching only the rest. With SQLite store the entries are stored
+    in the database and committed together with the data they refer to.
+    """
+    filename = ".export-journal"
+    def __init__(self, path: Path, store: SqliteStore = None, resume: bool = False):
+        self.path = path
+        self.store = store
+        self._lock = threading.Lock()
+        self.done = set()
+        self._file = None
+        if resume:
+            self.load()
+            logger.info(f"resuming interrupted export - {len(self.done)} entities already fetched")
+        else:
+            self.clear()
+        if store is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, mode="a", encoding="utf-8")
+    
+    @staticmethod
+    def key(entity: 'SavableHierEntity'):
+        parent_gid = entity.parent.gid if entity.parent is not None else ""
+        return f"{entity.kind}:{parent_gid}/{entity.gid}"
+    
+    def load(self):
+        if self.store is not None:
+            self.done = {data["key"] for data in self.store.children(None, "journal")}
+        elif self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                # last line may be cut off by the crash
+                self.done = {line[:-1] for line in f if line.endswith("\n")}
+    
+    def clear(self):
+        self.done = set()
+        if self.store is not None:
+            self.store.delete_kind("journal")
+        else:
+            self.path.unlink(missing_ok=True)
+    
+    def is_done(self, entity: 'SavableHierEntity') -> bool:
+        return self.key(entity) in self.done
+    
+    def record(self, entity: 'SavableHierEntity'):
+        key = self.key(entity)
+        if self.store is not None:
+            self.store.put("journal", key, None, None, {"key": key})
+            return
+        with self._lock:
+            self._file.write(key + "\n")
+            self._file.flush()
+    
+    def complete(self):
+        """Removes the journal after successful crawl, next run starts from scratch"""
+        self.close()
+        self.clear()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class FileNames:
+    """File names of all entities assigned in previous runs (directory key -> gid -> name)
+
+    Names are assigned when entities are created, so without it an entity could take the name
+    of a same-named sibling that was listed after it in a previous run and the incremental export
+    would then find raw data of the sibling under the name of the unchanged entity.
+    Names of entities that are not fetched again are kept, because their files stay on disk.
+
+    Names inside of a project are stored in `<project gid>.json` (workspaces and projects in `root.json`)
+    and loaded when the project is exported, `evict` saves them and drops them from memory.
+    """
+    dirname = ".export-names"
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        # project gid ("" for workspaces and projects) -> directory key -> gid -> name
+        self.scopes = {}
+    
+    def _file(self, scope: str) -> Path:
+        return self.path / f"{scope or 'root'}.json"
+    
+    def _names(self, scope: str) -> dict:
+        names = self.scopes.get(scope)
+        if names is None:
+            names = {}
+            if self._file(scope).exists():
+                with open(self._file(scope)) as f:
+                    names = json.load(f)
+            self.scopes[scope] = names
+        return names
+    
+    def get(self, scope: str, key: str) -> dict:
+        with self._lock:
+            return dict(self._names(scope).get(key, {}))
+    
+    def record(self, scope: str, key: str, gid: str, name: str):
+        with self._lock:
+            self._names(scope).setdefault(key, {})[gid] = name
+    
+    def forget(self, scope: str, key: str, gid: str):
+        with self._lock:
+            names = self._names(scope)
+            if key in names:
+                names[key].pop(gid, None)
+                if not names[key]:
+                    del names[key]
+    
+    def _save(self, scope: str):
+        path = self._file(scope)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, mode="w") as f:
+            json.dump(self.scopes[scope], f, sort_keys=True)
+        tmp_path.replace(path)
+    
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            for scope in self.scopes:
+                self._save(scope)
+    
+    def evict(self, scope: str):
+        """Saves names of project `scope` and drops them from memory (they are loaded again when needed)"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if scope in self.scopes:
+                self._save(scope)
+                del self.scopes[scope]
+    
+    def drop(self, scope: str):
+        """Removes names of a deleted project"""
+        with self._lock:
+            self.scopes.pop(scope, None)
+            self._file(scope).unlink(missing_ok=True)
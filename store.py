@@ -0,0 +1,104 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# Raw API responses of all entities in one SQLite database
+# Each row is one entity, "parent_gid" is gid of the entity it was fetched for
+# (empty for workspaces) and "position" keeps the order in which entities were returned by API.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    parent_gid TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    modified_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (parent_gid, kind, gid)
+);
+CREATE INDEX IF NOT EXISTS entities_gid ON entities (gid);
+CREATE INDEX IF NOT EXISTS entities_modified_at ON entities (modified_at);
+"""
+
+class SqliteStore:
+    """Stores raw responses in SQLite database, writes are buffered and committed in batches"""
+    def __init__(self, path: Path | str, batch_size: int = 500):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._position = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM entities").fetchone()[0]
+
+    def put(self, kind: str, gid: str, parent_gid: str | None, modified_at: str | None, data: dict):
+        with self._lock:
+            self._pending.append((parent_gid or "", kind, gid, self._position, modified_at, json.dumps(data, separators=(",", ":"))))
+            self._position += 1
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entities (parent_gid, kind, gid, position, modified_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def children(self, parent_gid: str | None, kind: str) -> list[dict]:
+        """Returns raw data of all entities of given kind fetched for `parent_gid` in API order"""
+        with self._lock:
+            self._flush()
+            rows = self.conn.execute(
+                "SELECT data FROM entities WHERE parent_gid = ? AND kind = ? ORDER BY position",
+                (parent_gid or "", kind),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, gid: str, kind: str) -> dict | None:
+        with self._lock:
+            self._flush()
+            row = self.conn.execute(
+                "SELECT data FROM entities WHERE gid = ? AND kind = ? ORDER BY position DESC LIMIT 1",
+                (gid, kind),
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def delete(self, kind: str, gid: str, parent_gid: str | None):
+        """Removes the entity fetched for `parent_gid` and, unless it is still stored under another parent
+        (e.g. task in several projects), all entities fetched for it"""
+        with self._lock:
+            self._flush()
+            with self.conn:
+                self.conn.execute("DELETE FROM entities WHERE parent_gid = ? AND kind = ? AND gid = ?", (parent_gid or "", kind, gid))
+                self._delete_children(gid)
+
+    def _delete_children(self, gid: str):
+        if self.conn.execute("SELECT 1 FROM entities WHERE gid = ? LIMIT 1", (gid,)).fetchone() is not None:
+            return
+        children = self.conn.execute("SELECT DISTINCT gid FROM entities WHERE parent_gid = ?", (gid,)).fetchall()
+        self.conn.execute("DELETE FROM entities WHERE parent_gid = ?", (gid,))
+        for (child_gid,) in children:
+            self._delete_children(child_gid)
+
+    def delete_kind(self, kind: str):
+        with self._lock:
+            self._flush()
+            with self.conn:
+                self.conn.execute("DELETE FROM entities WHERE kind = ?", (kind,))
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.conn.close()
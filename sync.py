@@ -0,0 +1,294 @@
+import json
+import logging
+import time
+
+from exporter import AsanaExporter, Project, Task, Workspace, remove_deleted
+from lazy import lazy_import
+from state import SYNC_TOKENS_FILE
+
+# Continuous export (--sync) - projects are updated from Asana events, only changed tasks
+# are fetched and only affected pages are rendered again
+
+asana = lazy_import("asana")
+asana_rest = lazy_import("asana.rest")
+
+logger = logging.getLogger(__name__)
+
+class SyncDaemon:
+    """Keeps the export up to date using Asana events (`--sync`)
+
+    Every project has its own sync token (stored in `sync_tokens.json` next to raw responses).
+    Each cycle requests events of every project, fetches again only tasks mentioned by the events
+    and renders only their pages and listings of their parents. A project whose sync token
+    expired (or that has no token yet) is fetched again completely.
+    """
+    tokens_filename = SYNC_TOKENS_FILE
+    def __init__(self, exporter: AsanaExporter, interval: float = 60.0):
+        self.exporter = exporter
+        self.cfg = exporter.cfg
+        self.interval = interval
+        # without raw responses the state cannot be loaded after restart, so tokens are not stored either
+        self.tokens_path = self.cfg.raw_base_path / self.tokens_filename if self.cfg.save_raw else None
+        # project gid -> sync token
+        self.tokens = {}
+        self.events_api = asana.EventsApi(self.cfg.api_client)
+        self.tasks_api = asana.TasksApi(self.cfg.api_client)
+
+    def load_tokens(self) -> bool:
+        if self.tokens_path is None or not self.tokens_path.exists():
+            return False
+        with open(self.tokens_path) as f:
+            self.tokens = json.load(f)
+        return True
+
+    def save_tokens(self):
+        if self.tokens_path is None:
+            return
+        self.tokens_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tokens_path.with_name(self.tokens_path.name + ".tmp")
+        with open(tmp_path, mode="w") as f:
+            json.dump(self.tokens, f, indent=2)
+        tmp_path.replace(self.tokens_path)
+
+    def run(self, cycles: int = None):
+        """Syncs every `interval` seconds, forever unless number of `cycles` is given"""
+        self.start()
+        cycle = 0
+        while True:
+            start = time.monotonic()
+            self.sync()
+            cycle += 1
+            if cycles is not None and cycle >= cycles:
+                return
+            time.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+    def start(self):
+        if self.load_tokens():
+            logger.info("sync: loading state of the previous sync from raw responses")
+            self.exporter.load_from_raw()
+        else:
+            # projects are fetched by the first cycle, all of them are new
+            logger.info(f"sync: no sync tokens in {self.tokens_path} - every project will be fetched")
+            self.exporter.workspaces = Workspace.get_workspaces(self.cfg)
+        if self.cfg.export_html:
+            self.exporter.export_html(self.cfg.html_templates["index"], path=self.cfg.html_base_path)
+
+    def sync(self):
+        changed = False
+        for ws in self.exporter.workspaces:
+            changed |= self.sync_projects(ws)
+            for prj in ws.projects:
+                changed |= self.sync_project(prj)
+        if not changed:
+            logger.debug("sync: no changes")
+            return
+        if self.cfg.search_index:
+            self.exporter.export_search()
+        if self.cfg.store is not None:
+            self.cfg.store.flush()
+        if self.cfg.file_names is not None:
+            self.cfg.file_names.save()
+        self.cfg.metrics.save_json(self.cfg.metrics_path(), extra={"render": self.cfg.render_stats})
+
+    def sync_projects(self, ws: Workspace) -> bool:
+        """Fetches list of projects of the workspace again, returns True if it changed
+
+        New projects get no sync token, so they are fetched completely by `sync_project`.
+        """
+        known = {prj.gid: prj for prj in ws.projects}
+        before = {prj.gid: (prj.name, prj.color) for prj in ws.projects}
+        ws.incomplete = False
+        ws.get_projects(known=known)
+        if ws.incomplete:
+            ws.projects = list(known.values())
+            return False
+        changed = False
+        for prj in ws.projects:
+            if prj.gid not in known:
+                logger.info(f"sync: new project {prj.name}")
+                changed = True
+            elif before[prj.gid] != (prj.name, prj.color):
+                if self.cfg.export_html:
+                    prj.export_pages()
+                changed = True
+        current = {prj.gid for prj in ws.projects}
+        removed = [prj for prj in known.values() if prj.gid not in current]
+        for prj in removed:
+            logger.info(f"sync: project {prj.name} was removed")
+            self.tokens.pop(prj.gid, None)
+            changed = True
+        remove_deleted(removed, ws.projects)
+        if changed and self.cfg.export_html:
+            ws.export_html(template=self.cfg.html_templates[ws.__class__.__name__])
+        return changed
+
+    def sync_project(self, prj: Project) -> bool:
+        """Applies events of the project since the previous cycle, returns True if anything changed"""
+        token = self.tokens.get(prj.gid)
+        try:
+            events = self.fetch_events(prj)
+            if events is None:
+                if token is not None:
+                    logger.warning(f"sync: sync token of project {prj.name} expired - fetching the whole project again")
+                else:
+                    logger.info(f"sync: fetching project {prj.name} completely")
+                prj.refresh()
+                ok = not prj.incomplete
+                if ok and self.cfg.export_html:
+                    prj.export()
+            elif len(events) == 0:
+                return False
+            else:
+                ok = self.apply(prj, events)
+        except asana_rest.ApiException as e:
+            logger.error(f"sync: exception when syncing project {prj.name}: {e}")
+            ok = False
+        if not ok:
+            # events are requested again in the next cycle
+            self.restore_token(prj, token)
+            return False
+        self.save_tokens()
+        return True
+
+    def restore_token(self, prj: Project, token: str | None):
+        if token is None:
+            self.tokens.pop(prj.gid, None)
+        else:
+            self.tokens[prj.gid] = token
+
+    def fetch_events(self, prj: Project) -> list[dict] | None:
+        """Returns events of the project since its sync token
+
+        Returns None when the project has no valid token, a new token is stored
+        and the project has to be fetched completely.
+        """
+        events = []
+        while True:
+            opts = {"sync": self.tokens[prj.gid]} if prj.gid in self.tokens else {}
+            try:
+                with self.cfg.metrics.track("get_events", prj, tolerate=(412,)):
+                    response = self.cfg.rate_limiter.call(lambda: self.events_api.get_events(prj.gid, opts, full_payload=True))
+            except asana_rest.ApiException as e:
+                # missing or expired token, the response contains a new one
+                if e.status != 412:
+                    raise
+                self.tokens[prj.gid] = json.loads(e.body)["sync"]
+                return None
+            events += response.get("data") or []
+            self.tokens[prj.gid] = response["sync"]
+            if not response.get("has_more"):
+                self.cfg.metrics.items("get_events", len(events))
+                return events
+
+    def fetch_task(self, prj: Project, gid: str) -> dict | None:
+        """Returns data of the task, None if it was deleted"""
+        opts = {"opt_fields": self.cfg.opt_fields["task"]}
+        try:
+            with self.cfg.metrics.track("get_task", prj, tolerate=(404,)):
+                data = self.cfg.rate_limiter.call(lambda: self.tasks_api.get_task(gid, opts))
+        except asana_rest.ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        self.cfg.metrics.items("get_task", 1)
+        return data
+
+    def apply(self, prj: Project, events: list[dict]) -> bool:
+        """Fetches tasks changed by `events` and renders affected pages, returns False if some request failed"""
+        index = {}
+        def add_to_index(tsk: Task):
+            index[tsk.gid] = tsk
+            for sub in tsk.subtasks:
+                add_to_index(sub)
+        for tsk in prj.tasks:
+            add_to_index(tsk)
+        # gid -> True, the last event of each task decides what happens with it
+        removed, added, changed = {}, {}, {}
+        def mark(target: dict, gid: str):
+            for state in (removed, added, changed):
+                state.pop(gid, None)
+            target[gid] = True
+        for event in events:
+            resource = event.get("resource") or {}
+            parent = event.get("parent") or {}
+            gid = resource.get("gid")
+            resource_type = resource.get("resource_type")
+            action = event.get("action")
+            if resource_type == "task":
+                if action == "deleted" or (action == "removed" and parent.get("gid") == prj.gid):
+                    mark(removed, gid)
+                elif parent.get("resource_type") == "task":
+                    # subtask added to or removed from a task - subtasks of the task are fetched again
+                    changed[parent["gid"]] = True
+                    if action != "removed":
+                        changed[gid] = True
+                elif gid in index:
+                    mark(changed, gid)
+                else:
+                    mark(added, gid)
+            elif resource_type in ("story", "attachment") and parent.get("resource_type") == "task":
+                changed[parent["gid"]] = True
+        logger.info(f"sync: project {prj.name} - {len(events)} events - {len(added)} new, {len(changed)} changed, {len(removed)} removed tasks")
+        ok = True
+        new_tasks = []
+        # entities whose pages are rendered again
+        pages = set()
+        def siblings(tsk: Task) -> list[Task]:
+            return tsk.parent.tasks if tsk.parent is prj else tsk.parent.subtasks
+        def attached(obj) -> bool:
+            """False if the task or one of its parents was removed"""
+            while obj is not prj:
+                if obj not in siblings(obj):
+                    return False
+                obj = obj.parent
+            return True
+        def remove(tsk: Task):
+            if tsk in siblings(tsk):
+                siblings(tsk).remove(tsk)
+                tsk.slug_registry().release(tsk.filename())
+                tsk.delete_files()
+                pages.add(tsk.parent)
+        for gid in removed:
+            if gid in index:
+                remove(index[gid])
+        for gid in added:
+            data = self.fetch_task(prj, gid)
+            if data is None or data.get("parent") or not self.cfg.scope.include_task(prj.gid, data):
+                continue
+            tsk = Task.from_data(data, self.cfg, parent=prj)
+            prj.tasks.append(tsk)
+            if self.cfg.save_raw:
+                tsk.save_raw()
+            self.cfg.scheduler.submit(tsk.get_all)
+            new_tasks.append(tsk)
+            pages.add(prj)
+        for gid in changed:
+            tsk = index.get(gid)
+            if tsk is None or not attached(tsk):
+                continue
+            data = self.fetch_task(prj, gid)
+            if data is None:
+                remove(tsk)
+                continue
+            tsk.update(data)
+            if self.cfg.save_raw:
+                tsk.save_raw()
+            subtasks = tsk.refresh()
+            if tsk.incomplete:
+                ok = False
+                continue
+            for sub in subtasks:
+                self.cfg.scheduler.submit(sub.get_all)
+            new_tasks += subtasks
+            # the parent lists name of the task
+            pages.add(tsk)
+            pages.add(tsk.parent)
+        self.cfg.scheduler.join()
+        ok = ok and not any(tsk.incomplete for tsk in new_tasks)
+        if self.cfg.export_html:
+            for tsk in new_tasks:
+                tsk.export()
+            for obj in pages:
+                if attached(obj):
+                    obj.export_pages()
+        return ok
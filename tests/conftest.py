@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# modules of the exporter are not installed, they are imported from the repository root
+sys.path.insert(0, str(ROOT))
+
+from benchmark.fake_server import FakeAsanaServer
+from benchmark.synthetic import SyntheticWorkspace
+
+
+def small_workspace() -> SyntheticWorkspace:
+    return SyntheticWorkspace(projects=2, tasks=6, subtasks=1, depth=1, stories=2, attachments=1, attachment_size=1000, seed=1)
+
+
+@pytest.fixture
+def server():
+    srv = FakeAsanaServer(small_workspace()).start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def asana_env(server, monkeypatch):
+    """Points the Asana client (of this process and of started exporters) to `server`"""
+    monkeypatch.setenv("ASANA_HOST", server.api_url)
+    monkeypatch.setenv("ASANA_TOKEN", "test")
+    return dict(os.environ)
+
+
+@pytest.fixture
+def run_exporter(asana_env, tmp_path):
+    """Runs exporter.py with given arguments in a separate process, returns the completed process"""
+    def run(output_dir: Path, *args: str) -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, "exporter.py", "-o", str(output_dir), "--log-file", str(tmp_path / "exporter.log"), "-j", "4", *args],
+                              cwd=ROOT, env=asana_env, capture_output=True, text=True, timeout=120)
+    return run
+
+
+def read_pages(output_dir: Path) -> dict[str, str]:
+    """Rendered HTML pages of an export by path relative to `output_dir`"""
+    return {str(path.relative_to(output_dir)): path.read_text(encoding="utf-8") for path in output_dir.rglob("*.html")}
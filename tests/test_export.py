@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+from conftest import read_pages
+
+# requests of a full export of `small_workspace` (2 projects, 12 tasks with one subtask each)
+TASKS = 24
+PLAIN_REQUESTS = {
+    "get_workspaces": 1,
+    "get_projects_for_workspace": 1,
+    "get_tasks_for_project": 2,
+    "get_stories_for_task": TASKS,
+    "get_attachments_for_object": TASKS,
+    # subtasks are not requested for tasks without them
+    "get_subtasks_for_task": TASKS // 2,
+    "download": TASKS,
+}
+
+
+def totals(output_dir) -> dict:
+    return json.loads((output_dir / "metrics.json").read_text())["totals"]
+
+
+@pytest.fixture
+def reference(server, run_exporter, tmp_path):
+    """Pages of a plain export"""
+    output_dir = tmp_path / "reference"
+    result = run_exporter(output_dir)
+    assert result.returncode == 0, result.stderr
+    assert server.endpoint_counts == PLAIN_REQUESTS
+    server.endpoint_counts.clear()
+    return read_pages(output_dir)
+
+
+def test_plain(server, run_exporter, tmp_path):
+    output_dir = tmp_path / "out"
+    result = run_exporter(output_dir)
+    assert result.returncode == 0, result.stderr
+    assert server.endpoint_counts == PLAIN_REQUESTS
+    assert totals(output_dir)["errors"] == 0
+    pages = read_pages(output_dir)
+    # index, search, workspace, 2 projects and all tasks
+    assert len(pages) == 5 + TASKS
+    assert len(list(output_dir.rglob("attachment-0.bin"))) == TASKS
+    assert not (output_dir / ".export-journal").exists()
+
+
+def test_batch_requests(server, run_exporter, reference, tmp_path):
+    output_dir = tmp_path / "out"
+    result = run_exporter(output_dir, "-b")
+    assert result.returncode == 0, result.stderr
+    counts = server.endpoint_counts
+    assert counts["create_batch_request"] > 0
+    for endpoint in ("get_stories_for_task", "get_attachments_for_object", "get_subtasks_for_task"):
+        assert endpoint not in counts
+    assert sum(counts.values()) < sum(PLAIN_REQUESTS.values())
+    assert read_pages(output_dir) == reference
+
+
+def test_rate_limited(server, run_exporter, reference, tmp_path):
+    server.rate_limit = 20
+    output_dir = tmp_path / "out"
+    result = run_exporter(output_dir)
+    assert result.returncode == 0, result.stderr
+    assert server.snapshot_stats()["rate_limited"] > 0
+    stats = totals(output_dir)
+    assert stats["rate_limited"] > 0
+    assert stats["retries"] > 0
+    assert stats["errors"] == 0
+    assert read_pages(output_dir) == reference
+
+
+def test_resume_after_failures(server, run_exporter, reference, tmp_path):
+    output_dir = tmp_path / "out"
+    server.fail("get_stories_for_task", 3)
+    result = run_exporter(output_dir)
+    assert result.returncode == 0, result.stderr
+    assert totals(output_dir)["errors"] == 3
+    assert (output_dir / ".export-journal").exists()
+    assert "--resume" in result.stderr
+
+    server.endpoint_counts.clear()
+    result = run_exporter(output_dir, "--resume")
+    assert result.returncode == 0, result.stderr
+    # only the tasks whose stories failed are fetched again
+    assert server.endpoint_counts["get_stories_for_task"] == 3
+    assert server.endpoint_counts["get_attachments_for_object"] == 3
+    assert "get_tasks_for_project" not in server.endpoint_counts
+    assert totals(output_dir)["errors"] == 0
+    assert not (output_dir / ".export-journal").exists()
+    assert read_pages(output_dir) == reference
+
+
+def test_sync_cycle(server, asana_env, reference, tmp_path):
+    import exporter
+    from sync import SyncDaemon
+    output_dir = tmp_path / "out"
+    cfg = exporter.ExportConfig(exporter.create_api_client(4), output_dir, exporter.create_templates(),
+                                network=exporter.NetworkOptions(concurrency=4), output=exporter.OutputOptions(download_attachments=False))
+    daemon = SyncDaemon(exporter.AsanaExporter(cfg), interval=0)
+    try:
+        daemon.run(cycles=1)
+        assert read_pages(output_dir) == reference
+
+        ws = server.workspace
+        project_gid = ws.projects[ws.workspaces[0]["gid"]][0]["gid"]
+        task = ws.tasks[project_gid][0]
+        ws.rename_task(task["gid"], "Renamed by sync")
+        server.endpoint_counts.clear()
+        daemon.sync()
+        # events of both projects, the changed task and its listings
+        assert server.endpoint_counts["get_events"] == 2
+        assert server.endpoint_counts["get_task"] == 1
+        assert "get_tasks_for_project" not in server.endpoint_counts
+        assert any("Renamed by sync" in content for content in read_pages(output_dir).values())
+    finally:
+        cfg.shutdown()
+        cfg.close()
+
+
+def test_sync_adds_subtask(server, asana_env, tmp_path):
+    import exporter
+    from sync import SyncDaemon
+    output_dir = tmp_path / "out"
+    cfg = exporter.ExportConfig(exporter.create_api_client(4), output_dir, exporter.create_templates(),
+                                network=exporter.NetworkOptions(concurrency=4, fields_profile="minimal"),
+                                output=exporter.OutputOptions(download_attachments=False))
+    exp = exporter.AsanaExporter(cfg)
+    daemon = SyncDaemon(exp, interval=0)
+    try:
+        daemon.run(cycles=1)
+        ws = server.workspace
+        project_gid = ws.projects[ws.workspaces[0]["gid"]][0]["gid"]
+        parent_gid = ws.tasks[project_gid][0]["gid"]
+        subtask = ws.add_subtask(parent_gid)
+        daemon.sync()
+        prj = next(prj for prj in exp.workspaces[0].projects if prj.gid == project_gid)
+        # the subtask is not listed in the project as a task on its own
+        assert subtask["gid"] not in [tsk.gid for tsk in prj.tasks]
+        parent = next(tsk for tsk in prj.tasks if tsk.gid == parent_gid)
+        assert subtask["gid"] in [sub.gid for sub in parent.subtasks]
+        assert sum(subtask["name"] in content for content in read_pages(output_dir).values()) > 0
+    finally:
+        cfg.shutdown()
+        cfg.close()
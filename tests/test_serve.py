@@ -0,0 +1,50 @@
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import read_pages
+
+
+@pytest.fixture
+def viewer_url(run_exporter, tmp_path):
+    """Export of the fake workspace served by `exporter.py serve`, returns (output directory, base URL)"""
+    import viewer
+    output_dir = tmp_path / "out"
+    result = run_exporter(output_dir)
+    assert result.returncode == 0, result.stderr
+    server = viewer.ViewerServer(viewer.create_viewer(output_dir), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield output_dir, f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url: str) -> bytes | None:
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        assert e.code == 404
+        return None
+
+
+def test_serves_rendered_pages_and_assets(viewer_url):
+    output_dir, url = viewer_url
+    for path, content in read_pages(output_dir).items():
+        assert get(url + urllib.request.quote(path)) == content.encode("utf-8")
+    attachment = next(output_dir.rglob("attachments/attachment-0.bin"))
+    assert get(url + urllib.request.quote(attachment.relative_to(output_dir).as_posix())) == attachment.read_bytes()
+    search_file = next((output_dir / "search").rglob("*.js"))
+    assert get(url + search_file.relative_to(output_dir).as_posix()) == search_file.read_bytes()
+
+
+def test_does_not_serve_raw_responses_and_state(viewer_url):
+    output_dir, url = viewer_url
+    hidden = [path for path in output_dir.rglob("*") if path.is_file() and (path.suffix == ".json" or ".export-names" in path.parts)]
+    assert any(path.name == "metrics.json" for path in hidden)
+    assert any(path.parent.name == "attachments" for path in hidden)
+    for path in hidden:
+        assert get(url + urllib.request.quote(path.relative_to(output_dir).as_posix())) is None
+    assert get(url + "../../etc/passwd") is None
@@ -0,0 +1,270 @@
+import argparse
+import json
+import locale
+import logging
+import mimetypes
+import shutil
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from exporter import AsanaExporter, Attachment, Project, SiteConfig, Task, Workspace, create_templates
+from metrics import METRICS_FILE
+from search import SEARCH_DIR
+from state import SYNC_TOKENS_FILE
+
+# Local web server rendering pages of an export on request from raw json responses
+#
+# Nothing is loaded at startup. URL of a page is the same as its path in the exported HTML
+# directory, so the entity is found by file names of raw responses (`<ws>/<project>/<task>.json`)
+# and only the entity, its parents and its direct children are loaded. Loaded entities and
+# rendered pages are kept in bounded LRU caches and reloaded when their raw files change.
+# Attachments and the search index are served from the HTML directory, other files
+# (raw responses, state of the exporter) are not served.
+#
+# Started by `python exporter.py serve ...`.
+
+parser = argparse.ArgumentParser(
+            prog="exporter.py serve",
+            description="Serves HTML pages of an export rendered on request from raw responses",
+            )
+parser.add_argument("-o", "--output-dir", default="out/", help="output directory of the export, default=./out/")
+parser.add_argument("-s", "--separate-responses", action='store_true', help="the export stores HTML and json files in separate directories")
+parser.add_argument("--host", default="127.0.0.1", help="default=127.0.0.1")
+parser.add_argument("--port", type=int, default=8000, help="default=8000")
+parser.add_argument("--cache-size", type=int, default=256, help="number of rendered pages and of loaded entities kept in memory, default=256")
+parser.add_argument("--page-size", type=int, default=100, help="number of tasks on one page of project and subtask listings (0 = no pagination), default=100")
+parser.add_argument("-l", "--locale", help="set locale - needed for locale aware sorting")
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Keeps at most `max_items` values, each value is valid only for the stamp it was stored with"""
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, stamp):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != stamp:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, stamp, value):
+        with self._lock:
+            self._items[key] = (stamp, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+class LazyExport:
+    """Loads entities of an export from raw json files by their path, renders their pages"""
+    # kind of entity by depth of its path (deeper entities are subtasks)
+    kinds = (Workspace, Project, Task)
+
+    def __init__(self, cfg: SiteConfig, cache_size: int = 256):
+        self.cfg = cfg
+        self.entities = LRUCache(cache_size)
+        self.pages = LRUCache(cache_size)
+        # entities are loaded and their children filled in by one request at a time
+        self._lock = threading.Lock()
+
+    def raw_path(self, segments: tuple[str, ...]) -> Path:
+        return self.cfg.raw_base_path.joinpath(*segments)
+
+    def stamp(self, segments: tuple[str, ...]) -> tuple | None:
+        """Modification times of raw files of the entity and of its children, None if there is no such entity"""
+        path = self.raw_path(segments)
+        if len(segments) > 0:
+            json_path = path.with_name(path.name + ".json")
+            if not json_path.is_file():
+                return None
+            paths = [json_path, path, path / "stories", path / "attachments"]
+        else:
+            paths = [path]
+        stamp = []
+        for p in paths:
+            try:
+                stamp.append(p.stat().st_mtime_ns)
+            except OSError:
+                stamp.append(0)
+        return tuple(stamp)
+
+    def entity(self, segments: tuple[str, ...]):
+        """Entity with given path (without its children), None if it does not exist"""
+        stamp = self.stamp(segments)
+        if stamp is None:
+            return None
+        obj = self.entities.get(segments, stamp)
+        if obj is not None:
+            return obj
+        parent = self.entity(segments[:-1]) if len(segments) > 1 else None
+        if len(segments) > 1 and parent is None:
+            return None
+        path = self.raw_path(segments)
+        with open(path.with_name(path.name + ".json")) as f:
+            data = json.load(f)
+        cls = self.kinds[min(len(segments), len(self.kinds)) - 1]
+        if cls is Workspace:
+            obj = Workspace.from_data(data, self.cfg)
+        else:
+            obj = cls.from_data(data, self.cfg, parent=parent)
+        obj.claim_filename(segments[-1])
+        self.entities.put(segments, stamp, obj)
+        return obj
+
+    def load_children(self, obj):
+        """Loads direct children needed for the page of `obj` (once per loaded entity)"""
+        if isinstance(obj, Workspace):
+            if not obj.projects:
+                obj.load_from_raw(project_gids=[])
+        elif isinstance(obj, Project):
+            if not obj.tasks:
+                obj.load_tasks_from_raw()
+        elif not obj.subtasks and not obj.stories and not obj.attachments:
+            obj.load_subtasks_from_raw(recursive=False)
+            obj.load_stories_from_raw()
+            obj.load_attachments_from_raw()
+
+    def render_index(self) -> str:
+        overview = AsanaExporter(self.cfg)
+        ignored = (METRICS_FILE, SYNC_TOKENS_FILE)
+        for path in sorted(self.cfg.raw_base_path.glob("*.json")):
+            if path.name not in ignored:
+                ws = self.entity((path.stem,))
+                if ws is not None:
+                    overview.workspaces.append(ws)
+        return self.cfg.html_templates["index"].render(data=overview)
+
+    def render(self, segments: tuple[str, ...], filename: str) -> str | None:
+        """Renders page `filename` of entity with path `segments`, None if there is no such page"""
+        if len(segments) == 0:
+            return self.render_index() if filename == "index.html" else None
+        obj = self.entity(segments)
+        if obj is None:
+            return None
+        self.load_children(obj)
+        if isinstance(obj, Workspace):
+            if filename != "index.html":
+                return None
+            return self.cfg.html_templates[Workspace.__name__].render(data=obj, page=None)
+        for page, template, context in obj.pages():
+            if page.filename() == filename:
+                return template.render(data=obj, page=page, **context)
+        return None
+
+    def page(self, url_path: str) -> bytes | None:
+        """HTML of the page at `url_path` (relative to the root of the export), None for other files"""
+        parts = tuple(part for part in url_path.split("/") if part not in ("", "."))
+        if url_path.endswith("/") or len(parts) == 0:
+            parts += ("index.html",)
+        if ".." in parts or not parts[-1].endswith(".html"):
+            return None
+        segments, filename = parts[:-1], parts[-1]
+        stamp = self.stamp(segments)
+        if stamp is None:
+            return None
+        html = self.pages.get(parts, stamp)
+        if html is not None:
+            return html
+        with self._lock:
+            content = self.render(segments, filename)
+        if content is None:
+            return None
+        html = content.encode("utf-8")
+        self.pages.put(parts, stamp, html)
+        return html
+
+    def asset(self, url_path: str) -> Path | None:
+        """File of the HTML directory at `url_path` that can be served (search index or attachment of a task)"""
+        parts = tuple(part for part in url_path.split("/") if part not in ("", "."))
+        if len(parts) == 0 or ".." in parts:
+            return None
+        if parts == ("search.html",) or (parts[0] == SEARCH_DIR and parts[-1].endswith(".js")):
+            pass
+        elif len(parts) >= 4 and parts[-2] == Attachment.save_dir:
+            # attachments are next to raw responses unless they are separated, only downloaded files are served
+            with self._lock:
+                tsk = self.entity(parts[:-2])
+                if not isinstance(tsk, Task):
+                    return None
+                self.load_children(tsk)
+                if not any(atch.file_name == parts[-1] for atch in tsk.attachments):
+                    return None
+        else:
+            return None
+        path = self.cfg.html_base_path.joinpath(*parts)
+        return path if path.is_file() else None
+
+class ViewerHandler(BaseHTTPRequestHandler):
+    server: 'ViewerServer'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        url_path = unquote(urlparse(self.path).path)
+        try:
+            html = self.server.export.page(url_path)
+        except Exception:
+            logger.exception(f"rendering {url_path} failed")
+            return self.send_error(500)
+        if html is not None:
+            return self.send_content(html, "text/html; charset=utf-8")
+        self.send_static(url_path)
+
+    def send_content(self, data: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_static(self, url_path: str):
+        """Serves a file from the HTML directory (attachments and search index)"""
+        path = self.server.export.asset(url_path)
+        if path is None:
+            return self.send_error(404)
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.end_headers()
+        with open(path, mode="rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+class ViewerServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, export: LazyExport, host: str = "127.0.0.1", port: int = 8000):
+        super().__init__((host, port), ViewerHandler)
+        self.export = export
+
+def create_viewer(output_dir: Path | str, separate_raw: bool = False, cache_size: int = 256, page_size: int = 100) -> LazyExport:
+    cfg = SiteConfig(output_dir, separate_raw, create_templates(), page_size=page_size)
+    # the search page can be linked only if the export contains it
+    cfg.search_index = (cfg.html_base_path / "search.html").exists()
+    return LazyExport(cfg, cache_size=cache_size)
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    if args.locale:
+        locale.setlocale(locale.LC_ALL, args.locale)
+    export = create_viewer(args.output_dir, args.separate_responses, args.cache_size, args.page_size)
+    server = ViewerServer(export, args.host, args.port)
+    logger.info(f"serving {args.output_dir} at http://{server.server_address[0]}:{server.server_address[1]}/index.html")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()